@@ -0,0 +1,37 @@
+"""
+Cold-start import benchmark: lazy `import wind_order`, headless compute, and the
+eager import chain the package used to pull in (models + matplotlib + scipy)
+"""
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(THIS_DIR, '..'))
+
+CASES = {
+    'import wind_order (lazy)': 'import wind_order',
+    'headless compute_loads': 'from wind_order import compute_loads; import wind_order.func_run.compute',
+    'eager (previous import chain)': 'import wind_order.models.calc_load, wind_order.models.ti_interp, '
+                                     'wind_order.func_run.run_func, matplotlib.pyplot, matplotlib.patches, '
+                                     'scipy.interpolate',
+}
+
+
+def cold_import(statement, repeat=5):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], check=True, env=env)
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+if __name__ == '__main__':
+    baseline = cold_import('pass')
+    for name, statement in CASES.items():
+        print(f'{name:32s}{(cold_import(statement) - baseline) * 1000:10.1f} ms')
@@ -0,0 +1,150 @@
+"""
+Stage benchmark on synthetic workbooks: WindParse, CalcRatedWindSpeed, TiInterp, CalcUltimateLoad,
+the fatigue case proportion and plotting, at 10 / 100 / 1,000 / 10,000 turbines.
+Every run is appended to a JSON-lines history; --compare prints the ratio to the previous run.
+
+usage: python local_test/bench_stages.py [-n 10 100 1000 10000] [-r 3] [--compare]
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(THIS_DIR, '..'))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+import pandas as pd
+from synthetic import make_tree
+from wind_order.models import WindParse, CalcRatedWindSpeed, TiInterp, CalcUltimateLoad
+from wind_order.models.calc_load import UL_PATTERN, FL_PATTERN, UL_NAME, FL_NAME
+from wind_order.models.fatigue_case import DEFAULT_CASE_TABLE
+from wind_order.models.regressor_store import load_regressor
+
+HISTORY = os.path.join(THIS_DIR, 'bench_history.jsonl')
+
+
+def timed(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times), result
+
+
+def bench_size(tree, n_turbine, repeat, plot_max):
+    """
+    Median seconds of every stage for one site workbook
+    :return: {stage: seconds}
+    """
+    enter_dir = tree['enter_dir']
+    path = tree['sites'][n_turbine]
+    load_regressor(tree['ul_folder'], UL_PATTERN, UL_NAME)
+    load_regressor(tree['fl_folder'], FL_PATTERN, FL_NAME)
+
+    def run(model):
+        model.run()
+        return model.pop()
+
+    results = {}
+    results['WindParse'], wind_outputs = timed(
+        lambda: run(WindParse(cur_dir=enter_dir, path=path, ref_path=[], cache=False)), repeat)
+    wind_params = wind_outputs['cus']
+    results['CalcRatedWindSpeed'], rws = timed(
+        lambda: run(CalcRatedWindSpeed(wind_condition=wind_params['condition'])), repeat)
+    results['TiInterp'], ti = timed(lambda: run(TiInterp(**dict(wind_params, rws=rws))), repeat)
+    results['CalcUltimateLoad'], loads = timed(
+        lambda: run(CalcUltimateLoad(ref_loads=[], u_folder=tree['ul_folder'], f_folder=tree['fl_folder'],
+                                     ti=ti, wind=wind_params)), repeat)
+
+    condition = wind_params['condition'].loc[wind_params['sites']]
+    results['fatigue_case_proportion'], _ = timed(
+        lambda: DEFAULT_CASE_TABLE.proportion(condition['K'], condition['A'], condition['V50'], 20), repeat)
+
+    if n_turbine <= plot_max:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from wind_order.func_run import plot_loads
+        show = plt.show
+        plt.show = lambda *args, **kwargs: None
+        try:
+            results['plot_loads'], _ = timed(
+                lambda: plot_loads({'ul': loads['ul'], 'fl': loads['fl'], 'ref_labels': {}, 'name': 'site'}), 1)
+        finally:
+            plt.show = show
+            plt.close('all')
+
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ''
+
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count()}
+
+
+def read_history(path):
+    if not os.path.isfile(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(current, previous):
+    """
+    Ratio current / previous of every (turbines, stage) timed in both runs
+    """
+    before = {(r['turbines'], r['stage']): r['seconds'] for r in previous['results']}
+    print(f"compared with {previous['env']['commit'] or '?'} at {previous['time']}")
+    for r in current['results']:
+        key = (r['turbines'], r['stage'])
+        if key in before and before[key] > 0:
+            print(f"{r['turbines']:>8d} {r['stage']:28s}{r['seconds'] / before[key]:8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='wind-order stage benchmark')
+    parser.add_argument('-n', '--turbines', type=int, nargs='*', default=[10, 100, 1000, 10000])
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per stage, the median is kept')
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'wind_order_bench'),
+                        help='directory of the synthetic workbooks, reused between runs')
+    parser.add_argument('--history', default=HISTORY, help='JSON-lines history file')
+    parser.add_argument('--plot-max', type=int, default=10000, help='largest farm the plotting is timed for')
+    parser.add_argument('--compare', action='store_true', help='print the ratio to the previous run')
+    parser.add_argument('--no-record', action='store_true', help='do not append this run to the history')
+    args = parser.parse_args(argv)
+
+    tree = make_tree(args.work, args.turbines)
+    run = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'env': environment(), 'repeat': args.repeat, 'results': []}
+    print(f"{'turbines':>8s} {'stage':28s}{'seconds':>10s}")
+    for n in args.turbines:
+        for stage, seconds in bench_size(tree, n, args.repeat, args.plot_max).items():
+            run['results'].append({'turbines': n, 'stage': stage, 'seconds': seconds})
+            print(f'{n:>8d} {stage:28s}{seconds:10.4f}')
+
+    history = read_history(args.history)
+    if args.compare and history:
+        compare(run, history[-1])
+    if not args.no_record:
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Check that the streaming workbook reader of WindParse gives the same frames as the pandas
+read_excel path, on synthetic site workbooks with and without blank rows between the data, and
+that a descriptive text column of 'Site Condition' is kept as text and an empty header cell of the
+turbine id column gives the index name None.
+
+usage: python local_test/check_reader.py [-n 10]
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(THIS_DIR, '..')))
+
+import numpy as np
+import pandas as pd
+from synthetic import site_workbook
+from wind_order.models.calc_load import CONDITION
+from wind_order.models import WindParse
+
+
+def parse(path, reader):
+    wind = WindParse(cur_dir=os.path.dirname(path), path=path, ref_path=[], reader=reader, cache=False)
+    wind.run()
+
+    return wind.pop()['cus']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--turbines', type=int, default=10, help='turbines of the site workbook')
+    args = parser.parse_args(argv)
+
+    failed = 0
+    cases = {'plain': {}, 'blank rows': {'blank_rows': True}, 'text column': {'text_column': True},
+             'no index header': {'index_header': None}}
+    with tempfile.TemporaryDirectory() as work:
+        for case, options in cases.items():
+            path = os.path.join(work, f'site_{case.replace(" ", "_")}.xlsx')
+            turbines = site_workbook(path, args.turbines, **options)
+            stream, excel = parse(path, 'stream'), parse(path, 'pandas')
+            assert stream['sites'] == turbines, f'stream reader lost turbines: {stream["sites"]}'
+            for key in ('condition', 'm1', 'm10', 'etm'):
+                try:
+                    pd.testing.assert_frame_equal(stream[key], excel[key])
+                except AssertionError as err:
+                    failed += 1
+                    print(f'{case} {key}: {err}')
+            condition = stream['condition']
+            if condition.index.name != excel['condition'].index.name:
+                failed += 1
+                print(f'{case} index name: {condition.index.name!r} != {excel["condition"].index.name!r}')
+            assert all(condition[c].dtype == np.float64 for c in CONDITION), condition.dtypes
+            if options.get('text_column'):
+                assert condition['Type'].tolist()[:2] == ['GW-155', 'GW-165'], condition['Type']
+            print(f'{case}: {len(stream["sites"])} turbines, {len(stream["m1"])} wind speeds, '
+                  f'columns {list(condition.columns)}')
+
+    print('stream and pandas readers agree' if not failed else f'{failed} sheets differ')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
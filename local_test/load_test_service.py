@@ -0,0 +1,101 @@
+"""
+Load test of the resident load query service on a synthetic site: latency percentiles and
+throughput for a number of concurrent client processes.
+
+A service is started on a free port for the synthetic tree unless --port points to a running one.
+
+usage: python local_test/load_test_service.py [-n 10] [-c 1 4 16] [-q 200] [--port 8765]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(THIS_DIR, '..'))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+from synthetic import make_tree
+from wind_order.models import WindParse
+from wind_order.func_run.service import LoadClient, site_payload
+
+
+def client_run(port, payload, n_query):
+    latencies = []
+    with LoadClient(port=port) as client:
+        client.loads(payload)
+        begin = time.perf_counter()
+        for _ in range(n_query):
+            start = time.perf_counter()
+            client.loads(payload)
+            latencies.append(time.perf_counter() - start)
+
+    return latencies, time.perf_counter() - begin
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_service(tree, port):
+    process = subprocess.Popen([sys.executable, '-m', 'wind_order.func_run.service', '-d', tree['enter_dir'],
+                                '--port', str(port), '-r'] + tree['refs'], cwd=REPO_DIR)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            with LoadClient(port=port, timeout=1) as client:
+                client.health()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('service did not start')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--turbines', type=int, default=10, help='turbines of the queried site')
+    parser.add_argument('-c', '--clients', type=int, nargs='*', default=[1, 4, 16], help='concurrent client processes')
+    parser.add_argument('-q', '--queries', type=int, default=200, help='queries per client')
+    parser.add_argument('--port', type=int, default=None, help='port of a running service')
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'wind_order_bench'),
+                        help='directory of the synthetic tree')
+    args = parser.parse_args(argv)
+
+    tree = make_tree(args.work, [args.turbines])
+    wind = WindParse(cur_dir=tree['enter_dir'], path=tree['sites'][args.turbines], ref_path=[])
+    wind.run()
+    payload = site_payload(wind.pop()['cus'])
+
+    port = args.port or free_port()
+    process = None if args.port else start_service(tree, port)
+    try:
+        print(f'{"clients":>8} {"req/s":>9} {"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"batch":>7}')
+        for n_client in args.clients:
+            with LoadClient(port=port) as client:
+                before = client.health()
+            with ProcessPoolExecutor(max_workers=n_client) as pool:
+                futures = [pool.submit(client_run, port, payload, args.queries) for _ in range(n_client)]
+                runs = [f.result() for f in futures]
+            latencies = np.concatenate([run[0] for run in runs]) * 1000
+            elapsed = max(run[1] for run in runs)
+            with LoadClient(port=port) as client:
+                after = client.health()
+            batch = (after['requests'] - before['requests']) / max(after['batches'] - before['batches'], 1)
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            print(f'{n_client:>8} {len(latencies) / elapsed:>9.1f} {p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {batch:>7.2f}')
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
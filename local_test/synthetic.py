@@ -0,0 +1,125 @@
+"""
+Synthetic site workbooks and regressor folders in the layout WindParse and the regressor
+store expect, for benchmarks and regression checks without the private project workbooks
+"""
+import os
+import numpy as np
+from openpyxl import Workbook
+
+CONDITION = ['θmean', 'α', 'ρ', 'V50', 'K', 'A']
+CONDITION_UNIT = ['deg', '-', 'kg/m3', 'm/s', '-', 'm/s']
+TI_VARIABLES = ['Ir_m1', 'Ir+2_m1', 'Ir-2_m1', 'Iout_m1', 'Ir_m10', 'Iin_m10', 'Iout_m10', 'Iend_m10'] + \
+               ['ETM' + str(d) for d in [3, 5, 7, 9, 11, 13, 15, 17, 19, 20]] + \
+               ['I%d_m10' % d for d in [3, 5, 7, 9, 11, 13, 15, 17, 19, 20]]
+REGRESSOR_VARIABLES = ['常量', '平均入流角β', '风切变α', '空气密度ρ', '极限风速V50']
+
+
+def site_workbook(path, n_turbine, seed=0, prefix='T', cut_out=20, gaps=True, blank_rows=False, text_column=False,
+                  index_header='Turbine'):
+    """
+    Site workbook: 'Site Condition' (turbine x θmean, α, ρ, V50, K, A) and the M=1, M=10, ETM
+    turbulence sheets (wind speed x turbine), each with a unit row and a trailing note column
+    :param gaps: leave a few empty cells, filled from the previous row by WindParse
+    :param blank_rows: insert empty rows between turbines and wind speeds, and a row with an id but no data
+    :param text_column: add a descriptive 'Type' column to 'Site Condition' after the numeric columns
+    :param index_header: header of the turbine id column of 'Site Condition', None leaves the cell empty
+    :return: turbine ids
+    """
+    rng = np.random.default_rng(seed)
+    width = max(3, len(str(n_turbine - 1)))
+    turbines = [f'{prefix}{i:0{width}d}' for i in range(n_turbine)]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Site Condition')
+    text = ['Type'] if text_column else []
+    ws.append([index_header] + CONDITION + text + [None, 'Note'])
+    ws.append(['-'] + CONDITION_UNIT + ['-'] * len(text) + [None, 'unit row'])
+    condition = np.column_stack([rng.uniform(0, 8, n_turbine), rng.uniform(0.05, 0.3, n_turbine),
+                                 rng.uniform(1.0, 1.25, n_turbine), rng.uniform(30, 45, n_turbine),
+                                 rng.uniform(1.6, 2.4, n_turbine), rng.uniform(6, 9, n_turbine)])
+    for k, (turbine, row) in enumerate(zip(turbines, condition.tolist())):
+        if blank_rows and k % 2:
+            ws.append([])
+        ws.append([turbine] + row + [f'GW-{155 + 10 * (k % 2)}'] * len(text))
+    if blank_rows:
+        ws.append(['no data'])
+
+    speeds = np.arange(3, cut_out + 0.5, 0.5)
+    for name, base in [('M=1', 0.12), ('M=10', 0.15), ('ETM', 0.25)]:
+        ws = wb.create_sheet(name)
+        ws.append(['Wind Speed'] + turbines + [None, 'Note'])
+        ws.append(['m/s'] + ['-'] * n_turbine)
+        for k, v in enumerate(speeds):
+            row = [float(v)] + (base + 1.0 / (v + 2) + rng.uniform(0, 0.02, n_turbine)).tolist()
+            if gaps and k % 7 == 3:
+                row[1 + k % n_turbine] = None
+            if blank_rows and k % 5 == 2:
+                ws.append([None] * (n_turbine + 1))
+            ws.append(row)
+    wb.save(path)
+
+    return turbines
+
+
+def regressor_folder(folder, kind, count, seed=1):
+    """
+    Regressor workbooks Regress_UL_<nn>.xlsx (kind 'UL') or Regress_RF_Case<nnn>.xlsx (kind 'FL'):
+    title row, variable/channel header, unit row, then one coefficient row per variable
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    channel = 'UL_TB_Mxy' if kind == 'UL' else 'RF_TB_My_m4'
+    for i in range(1, count + 1):
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Sheet1')
+        ws.append(['title', None, None])
+        ws.append(['var', channel, 'other'])
+        ws.append(['unit', 'kNm', '-'])
+        ws.append([REGRESSOR_VARIABLES[0], rng.uniform(1e4, 5e4), 1])
+        ws.append([REGRESSOR_VARIABLES[1], rng.uniform(-100, 100), 1])
+        ws.append([REGRESSOR_VARIABLES[2], rng.uniform(-1e3, 1e3), 1])
+        ws.append([REGRESSOR_VARIABLES[3], rng.uniform(1e3, 1e4), 1])
+        if i % 3:
+            ws.append([REGRESSOR_VARIABLES[4], rng.uniform(10, 100), 1])
+        ws.append([TI_VARIABLES[i % len(TI_VARIABLES)], rng.uniform(1e4, 1e5), 1])
+        name = 'Regress_UL_%02d.xlsx' % i if kind == 'UL' else 'Regress_RF_Case%03d.xlsx' % i
+        wb.save(os.path.join(folder, name))
+
+
+def make_tree(root, n_turbine=(10,), n_ul=39, n_fl=123, seed=0):
+    """
+    Directory tree as the notebooks use it: <root>/enter, <root>/files/Regress_*, <root>/files/Loads,
+    plus one site workbook site_<n>.xlsx per turbine count and three reference workbooks
+    :return: {'enter_dir', 'ul_folder', 'fl_folder', 'sites': {n: path}, 'refs': [path]}
+    """
+    enter_dir = os.path.join(root, 'enter')
+    ul_folder = os.path.join(root, 'files', 'Regress_UL_01-39')
+    fl_folder = os.path.join(root, 'files', 'Regress_FL_001-123')
+    os.makedirs(enter_dir, exist_ok=True)
+    os.makedirs(os.path.join(root, 'files', 'Loads'), exist_ok=True)
+    if not os.path.isdir(ul_folder):
+        regressor_folder(ul_folder, 'UL', n_ul, seed + 1)
+    if not os.path.isdir(fl_folder):
+        regressor_folder(fl_folder, 'FL', n_fl, seed + 2)
+
+    sites = {}
+    for n in n_turbine:
+        sites[n] = os.path.join(root, f'site_{n}.xlsx')
+        if not os.path.isfile(sites[n]):
+            site_workbook(sites[n], n, seed)
+    refs = []
+    for k, (n, cut_out) in enumerate([(5, 20), (4, 19), (3, 18)]):
+        refs.append(os.path.join(root, f'ref{"ABC"[k]}.xlsx'))
+        if not os.path.isfile(refs[-1]):
+            site_workbook(refs[-1], n, seed + 10 + k, prefix=f'ref{"ABC"[k]}-', cut_out=cut_out)
+
+    return {'enter_dir': enter_dir, 'ul_folder': ul_folder, 'fl_folder': fl_folder, 'sites': sites, 'refs': refs}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a synthetic wind-order directory tree')
+    parser.add_argument('root', help='output directory')
+    parser.add_argument('-n', '--turbines', type=int, nargs='*', default=[10], help='turbine counts of the sites')
+    args = parser.parse_args()
+    print(make_tree(args.root, args.turbines))
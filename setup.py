@@ -16,5 +16,7 @@ setup(name=name,
 	  packages=find_packages(),
       # packages=['gw_tower'],
       # package_data = {'gw_tower': ['tower_schema.json']},   # extra, non-python data
-      install_requires=['pandas', 'numpy', 'scipy']       # other packages we depend on!
+      install_requires=['pandas', 'numpy', 'openpyxl'],   # other packages we depend on!
+      extras_require={'arrow': ['pyarrow']},               # parquet / feather result sinks
+      entry_points={'console_scripts': ['wind-order-batch = wind_order.func_run.batch_run:main']}
 )
\ No newline at end of file
@@ -1,6 +1,33 @@
-from .models import Base
-from .models import WindParse
-from .models import CalcRatedWindSpeed
-from .models import TiInterp
-from .models import CalcUltimateLoad
-from .func_run import main_run
+"""
+wind order models
+
+Names are imported lazily on first use, so that `import wind_order` stays cheap and
+headless use (compute_loads) never imports matplotlib.
+"""
+
+import importlib
+
+_LAZY = {
+    'Base': '.models',
+    'WindParse': '.models',
+    'CalcRatedWindSpeed': '.models',
+    'TiInterp': '.models',
+    'CalcUltimateLoad': '.models',
+    'main_run': '.func_run',
+    'compute_loads': '.func_run',
+    'batch_run': '.func_run',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
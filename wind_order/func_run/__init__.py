@@ -1 +1,30 @@
-from .run_func import main_run
+import importlib
+
+_LAZY = {
+    'main_run': '.run_func',
+    'compute_loads': '.compute',
+    'batch_run': '.batch_run',
+    'plot_loads': '.run_func',
+    'IncrementalRun': '.incremental',
+    'sweep': '.sweep',
+    'monte_carlo': '.monte_carlo',
+    'match_refs': '.match',
+    'submit': '.background',
+    'refit': '.refit',
+    'LoadService': '.service',
+    'LoadClient': '.service',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Background execution of runs with progress and cancellation
+
+A run is submitted to a small thread pool shared by the process (the notebook kernel), so
+widget callbacks return at once. The run reports progress through the callback it gets as
+keyword 'progress'; every report is also a cancellation point.
+
+    job = submit(runner.run, wind_path, ref_path, on_progress=update_bar, on_done=show)
+    job.cancel()
+
+@author: 36719
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+BACKGROUND_WORKERS = 2
+
+_EXECUTOR = []
+_LOCK = threading.Lock()
+
+
+class Cancelled(Exception):
+    """
+    Raised at the next progress report of a cancelled job
+    """
+
+
+class Job:
+    """
+    Handle of a background run
+    :param on_progress: called as on_progress(stage, done, total, result) from the worker thread
+    :param on_done: called as on_done(job) from the worker thread when the run ends in any way
+    """
+
+    def __init__(self, on_progress=None, on_done=None):
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.stages = {}
+        self.future = None
+        self._cancel = threading.Event()
+
+    def report(self, stage, done, total, result=None):
+        """
+        Progress callback handed to the run, raises Cancelled once the job is cancelled
+        """
+        if self._cancel.is_set():
+            raise Cancelled()
+        self.stages[stage] = (done, total)
+        if self.on_progress is not None:
+            self.on_progress(stage, done, total, result)
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def exception(self, timeout=None):
+        return self.future.exception(timeout)
+
+
+def submit(func, *args, on_progress=None, on_done=None, **kwargs):
+    """
+    Run func(*args, progress=job.report, **kwargs) on the background executor
+    :return: Job
+    """
+    job = Job(on_progress, on_done)
+    job.future = _executor().submit(func, *args, progress=job.report, **kwargs)
+    if on_done is not None:
+        job.future.add_done_callback(lambda _: on_done(job))
+
+    return job
+
+
+def _executor():
+    with _LOCK:
+        if not _EXECUTOR:
+            _EXECUTOR.append(ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS,
+                                                thread_name_prefix='wind-order'))
+
+    return _EXECUTOR[0]
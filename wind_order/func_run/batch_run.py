@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Batch run of many site wind parameter files
+
+Regressors and reference loads are loaded once, the farms are sharded across worker
+processes which keep them warm, and one consolidated UL/FL table is written. The tables are
+appended to a result sink farm by farm as the workers finish, with --detail the per-DLC
+loads and turbulence intensity tables as well (these are not kept in memory). Farms that fail
+to parse or evaluate are listed in the table 'failed' and make the command exit with status 1.
+
+usage: python -m wind_order.func_run.batch_run "项目场址风参/*.xlsx" -r ref1.xlsx ref2.xlsx -o result.csv
+       python -m wind_order.func_run.batch_run "项目场址风参/*.xlsx" -o results --format parquet --detail
+
+@author: 36719
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from wind_order.models import WindParse
+from wind_order.func_run.compute import gen_loads, loads_tables, prepare_refs, ref_library, warm_regressors, \
+    stage_executor
+from wind_order.utils.result_sink import open_sink, SINKS
+
+
+COLUMNS = ['farm', 'turbine', 'ul', 'fl', 'worst_ref']
+DETAIL_TABLES = ['ul_dlc', 'fl_dlc', 'ti']
+FAILED_COLUMNS = ['farm', 'path', 'error']
+
+# warm pipeline of a worker process
+_WORKER = {}
+
+
+def batch_run(enter_dir, sites, ref_path, out_path=None,
+              regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+              max_workers=None, fmt=None, detail=False):
+    """
+    Normalized loads of many farms against the same reference winds
+    :param enter_dir: the dir of file calling this function
+    :param sites: directory, glob pattern or list of farm wind parameter paths
+    :param ref_path: reference wind parameter path
+    :param out_path: result file (.csv, .xlsx, .parquet, .feather), folder or ResultSink, not written if None;
+                     the consolidated table is 'loads', a file path holds it and the other tables are written
+                     next to it (Excel: one sheet per table)
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param max_workers: number of processes, default cpu count
+    :param fmt: result format 'csv', 'excel', 'parquet' or 'feather', default from the extension of out_path
+    :param detail: True to write the tables 'ul_dlc', 'fl_dlc' (unnormalized loads of every dlc) and 'ti' too
+    :return: data frame [farm, turbine, ul, fl, worst_ref], throughput in attrs['farms_per_second'],
+             farms that failed in attrs['failed'] as [(farm, error)] (also the sink table 'failed')
+    """
+    start = time.perf_counter()
+    site_paths = site_list(sites)
+    regress_ul_folder = os.path.abspath(os.path.join(enter_dir, regress_ul_folder))
+    regress_fl_folder = os.path.abspath(os.path.join(enter_dir, regress_fl_folder))
+
+    library = ref_library(enter_dir)
+    prepare_refs(ref_path, library, regress_ul_folder, regress_fl_folder, enter_dir, max_workers)
+    ref_names = [os.path.splitext(os.path.split(path)[-1])[0] for path in ref_path]
+    ref_loads = library.get(ref_names)
+
+    detail = detail and out_path is not None
+    init_args = (enter_dir, regress_ul_folder, regress_fl_folder, ref_names, ref_loads, detail)
+    max_workers = min(max(len(site_paths), 1), max_workers or os.cpu_count() or 1)
+    sink = open_sink(out_path, fmt, main='loads') if out_path is not None else None
+    results = []
+    failures = []
+    try:
+        if max_workers == 1:
+            init_worker(*init_args)
+            collect(map(farm_loads, site_paths), results, sink, failures)
+        else:
+            chunk_size = max(1, len(site_paths) // (max_workers * 4))
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=init_args) as pool:
+                collect(pool.map(farm_loads, site_paths, chunksize=chunk_size), results, sink, failures)
+    finally:
+        if sink is not None and sink is not out_path:
+            sink.close()
+
+    table = pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=COLUMNS)
+
+    elapsed = time.perf_counter() - start
+    table.attrs['farms_per_second'] = len(site_paths) / elapsed if elapsed > 0 else float('inf')
+    table.attrs['failed'] = [(f['farm'], f['error']) for frame in failures for f in frame.to_dict('records')]
+    print(f'Tip: {len(site_paths)} farms in {elapsed:.2f}s, {table.attrs["farms_per_second"]:.2f} farms/s.')
+    if failures:
+        print(f'Tip: {len(failures)} farms failed, {[farm for farm, _ in table.attrs["failed"]]}.')
+
+    return table
+
+
+def site_list(sites):
+    """
+    Farm wind parameter paths from a directory, a glob pattern or a list
+    """
+    if isinstance(sites, (list, tuple)):
+        return list(sites)
+    if os.path.isdir(sites):
+        return sorted(os.path.join(sites, f) for f in os.listdir(sites)
+                      if f.endswith(('.xlsx', '.xls')) and not f.startswith('~$'))
+
+    return sorted(glob.glob(sites))
+
+
+def collect(farm_results, results, sink, failures):
+    """
+    Append the tables of every farm to the sink as they arrive, keep the consolidated rows and the failures
+    """
+    for tables in farm_results:
+        results.append(tables['loads'])
+        if 'failed' in tables:
+            failures.append(tables['failed'])
+        if sink is not None:
+            for name, frame in tables.items():
+                sink.write(name, frame)
+
+
+def init_worker(enter_dir, regress_ul_folder, regress_fl_folder, ref_names, ref_loads, detail=False):
+    """
+    Keep regressors and reference loads warm in the worker process
+    """
+    warm_regressors(regress_ul_folder, regress_fl_folder)
+    _WORKER.update(enter_dir=enter_dir, regress_ul_folder=regress_ul_folder, regress_fl_folder=regress_fl_folder,
+                   ref_names=ref_names, ref_loads=ref_loads, executor=stage_executor(enter_dir), detail=detail)
+
+
+def farm_loads(path):
+    """
+    Result tables of one farm, evaluated with the warm pipeline of the worker
+    :return: {'loads': data frame [farm, turbine, ul, fl, worst_ref][, 'ul_dlc', 'fl_dlc', 'ti': data frames]},
+             or an empty 'loads' and 'failed': data frame [farm, path, error] if the farm failed
+    """
+    farm = os.path.splitext(os.path.split(path)[-1])[0]
+    detail = _WORKER.get('detail', False)
+    try:
+        wind = WindParse(cur_dir=_WORKER['enter_dir'], path=path, ref_path=[])
+        wind.run()
+        wind_params = wind.pop()['cus']
+        loads = gen_loads(wind_params, _WORKER['ref_loads'], _WORKER['enter_dir'],
+                          _WORKER['regress_ul_folder'], _WORKER['regress_fl_folder'], executor=_WORKER['executor'],
+                          keep_tables=detail)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        print(f'Tip: [{farm}] failed, {error}')
+        return {'loads': pd.DataFrame(columns=COLUMNS),
+                'failed': pd.DataFrame({'farm': [farm], 'path': [path], 'error': [error]}, columns=FAILED_COLUMNS)}
+
+    sites = wind_params['sites']
+    ul = loads['ul'].iloc[:len(sites)].to_numpy()
+    fl = loads['fl'].iloc[:len(sites)].to_numpy()
+
+    tables = {'loads': pd.DataFrame({'farm': farm, 'turbine': sites, 'ul': ul, 'fl': fl,
+                                     'worst_ref': worst_ref(ul, fl, loads, len(sites))})}
+    if detail:
+        detail_tables = loads_tables(loads, sites, farm=farm)
+        tables.update((name, detail_tables[name]) for name in DETAIL_TABLES)
+
+    return tables
+
+
+def worst_ref(ul, fl, loads, n_site):
+    """
+    Reference whose normalized UL/FL envelope leaves the smallest margin to each turbine
+    :return: list of reference names, '' without reference
+    """
+    ref_names = _WORKER['ref_names']
+    if len(ref_names) == 0:
+        return [''] * n_site
+
+    margins = []
+    start = n_site
+    for ref in _WORKER['ref_loads']:
+        stop = start + len(ref['ul'])
+        ul_env = loads['ul'].iloc[start:stop].max()
+        fl_env = loads['fl'].iloc[start:stop].max()
+        margins.append(np.minimum(ul_env - ul, fl_env - fl))
+        start = stop
+
+    return [ref_names[i] for i in np.argmin(np.array(margins), axis=0)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch run of site wind parameter files')
+    parser.add_argument('sites', help='directory or glob pattern of site wind parameter files')
+    parser.add_argument('-r', '--ref', nargs='*', default=[], help='reference wind parameter files')
+    parser.add_argument('-o', '--out', default=None,
+                        help='result file (.csv, .xlsx, .parquet, .feather) or folder, '
+                             'default batch_loads with the extension of --format (.csv)')
+    parser.add_argument('--format', default=None, choices=['csv', 'excel', 'parquet', 'feather'],
+                        help='result format, default from the extension of --out (parquet for a folder)')
+    parser.add_argument('--detail', action='store_true', help='write per-DLC loads and TI tables as well')
+    parser.add_argument('-d', '--enter-dir', default=os.getcwd(),
+                        help='dir the regressor and Loads folders are relative to (../files)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--ul', default="../files/Regress_UL_01-39", help='dir of ultimate load regressor')
+    parser.add_argument('--fl', default="../files/Regress_FL_001-123", help='dir of fatigue load regressor')
+    args = parser.parse_args(argv)
+    out = args.out or 'batch_loads' + SINKS[args.format or 'csv'].extension
+
+    table = batch_run(args.enter_dir, args.sites, args.ref, out, regress_ul_folder=args.ul,
+                      regress_fl_folder=args.fl, max_workers=args.workers, fmt=args.format, detail=args.detail)
+
+    return 1 if table.attrs['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Headless computation of loads, without plotting
+
+@author: 36719
+"""
+
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from wind_order.models import WindParse
+from wind_order.models import CalcRatedWindSpeed
+from wind_order.models import CalcUltimateLoad
+from wind_order.models import TiInterp
+from wind_order.models.ref_library import RefLoadLibrary
+from wind_order.models.wind_parse import LIBRARY_NAME
+from wind_order.models.regressor_store import load_regressor
+from wind_order.models.calc_load import UL_PATTERN, FL_PATTERN, UL_NAME, FL_NAME, CONDITION
+from wind_order.models.turbine_table import TurbineTable
+from wind_order.models.platform import PlatformRegistry, Platform, DEFAULT_PLATFORM
+from wind_order.models.stage import StageExecutor, code_version, path_digest
+from wind_order.utils import span
+from wind_order.utils.result_sink import ResultSink
+import pandas as pd
+import threading
+import hashlib
+import os
+import re
+
+
+PLATFORM_CONFIG = 'platforms.json'
+
+# platform registry of the process, {(files dir, mtime of platforms.json): PlatformRegistry}
+_REGISTRIES = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def compute_loads(enter_dir, wind_path, ref_path,
+                  regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+                  max_workers=None, progress=None, platform=None):
+    """
+    wind-order computation without plotting
+    :param enter_dir: the dir of file calling this function
+    :param wind_path: farm wind parameter path
+    :param ref_path: reference wind parameter path
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param max_workers: processes computing missing reference loads, default cpu count
+    :param progress: callback progress(stage, done, total, result) of the stages 'references', 'parse',
+                     'turbines' and 'done' (result: the loads)
+    :param platform: turbine platform id of the platform registry (or a Platform), its regressor folders
+                     replace regress_ul_folder / regress_fl_folder
+    :return: {'ul': normalized ultimate load, 'fl': normalized fatigue load,
+              'ref_labels': {reference name: [turbine label]}, 'name': farm name}
+    """
+
+    custom_wind_name = os.path.splitext(os.path.split(wind_path)[-1])[0]
+
+    if platform is None:
+        regress_ul_folder = os.path.abspath(os.path.join(enter_dir, regress_ul_folder))
+        regress_fl_folder = os.path.abspath(os.path.join(enter_dir, regress_fl_folder))
+        regressors = (regress_ul_folder, regress_fl_folder)
+    else:
+        platform, regressors = platform_regressors(enter_dir, platform)
+        regress_ul_folder, regress_fl_folder = platform.ul_folder, platform.fl_folder
+
+    """ reference load library """
+    library = ref_library(enter_dir, platform)
+    with span('prepare refs', 'refs', count=len(ref_path)):
+        prepare_refs(ref_path, library, regress_ul_folder, regress_fl_folder, enter_dir, max_workers, progress,
+                     platform, regressors if platform is not None else None)
+
+    """ wind_parse model """
+    report(progress, 'parse', 0, 1)
+    wind = WindParse(cur_dir=enter_dir, path=wind_path, ref_path=ref_path)
+    wind.run()
+    wind_outputs = wind.pop()
+    n_site = len(wind_outputs['cus']['sites'])
+    report(progress, 'parse', 1, 1)
+
+    ref_names = wind_outputs['ref_names']
+    with span('reference loading', 'refs', count=len(ref_names)):
+        ref_loads = library.get(ref_names)
+
+    report(progress, 'turbines', 0, n_site)
+    cur_loads = gen_loads(wind_outputs['cus'], ref_loads, enter_dir, *regressors,
+                          save_loads=False, executor=stage_executor(enter_dir), platform=platform)
+
+    loads = {'ul': cur_loads['ul'], 'fl': cur_loads['fl'], 'ref_labels': library.labels(ref_names),
+             'name': custom_wind_name}
+    report(progress, 'turbines', n_site, n_site)
+    report(progress, 'done', 1, 1, loads)
+
+    return loads
+
+
+def report(progress, stage, done, total, result=None):
+    """
+    Report stage progress to an optional callback progress(stage, done, total, result)
+    """
+    if progress is not None:
+        progress(stage, done, total, result)
+
+
+def ref_library(enter_dir, platform=None):
+    """
+    Reference load library of files/Loads, legacy <name>_loads.json files are imported on first use
+    :param enter_dir: the dir of file calling this function
+    :param platform: Platform, every platform but the default one has its own library
+    :return: RefLoadLibrary
+    """
+    load_dir = os.path.abspath(os.path.join(enter_dir, '../files/Loads'))
+    if platform is None or platform.platform_id == DEFAULT_PLATFORM:
+        library = RefLoadLibrary(os.path.join(load_dir, LIBRARY_NAME))
+        library.import_json(load_dir)
+    else:
+        stem, ext = os.path.splitext(LIBRARY_NAME)
+        name = re.sub(r'[^\w.-]', '_', str(platform.platform_id))
+        library = RefLoadLibrary(os.path.join(load_dir, f'{stem}_{name}{ext}'))
+
+    return library
+
+
+def platform_registry(enter_dir):
+    """
+    Platform registry of the process: the 'default' platform of the regressor folders in files,
+    and the platforms of files/platforms.json if it exists
+    :param enter_dir: the dir of file calling this function
+    :return: PlatformRegistry
+    """
+    files_dir = os.path.abspath(os.path.join(enter_dir, '../files'))
+    config = os.path.join(files_dir, PLATFORM_CONFIG)
+    key = (files_dir, os.stat(config).st_mtime_ns if os.path.isfile(config) else None)
+    with _REGISTRY_LOCK:
+        registry = _REGISTRIES.get(key)
+        if registry is None:
+            registry = PlatformRegistry()
+            registry.register(DEFAULT_PLATFORM, os.path.join(files_dir, 'Regress_UL_01-39'),
+                              os.path.join(files_dir, 'Regress_FL_001-123'))
+            if key[1] is not None:
+                registry.read_config(config)
+            _REGISTRIES.clear()
+            _REGISTRIES[key] = registry
+
+    return registry
+
+
+def platform_regressors(enter_dir, platform):
+    """
+    Platform and its ultimate and fatigue regressor sets, from the platform registry
+    :param platform: platform id or Platform (not registered: its folders are loaded with the process store)
+    :return: Platform, (ultimate regressor, fatigue regressor)
+    """
+    if isinstance(platform, Platform):
+        return platform, (load_regressor(platform.ul_folder, UL_PATTERN, UL_NAME),
+                          load_regressor(platform.fl_folder, FL_PATTERN, FL_NAME))
+    registry = platform_registry(enter_dir)
+
+    return registry.get(platform), registry.regressors(platform)
+
+
+def prepare_refs(ref_path, library, regress_ul_folder, regress_fl_folder, enter_dir, max_workers=None,
+                 progress=None, platform=None, regressors=None):
+    """
+    Parse and evaluate the reference winds missing from the library, or stale because the workbook,
+    the regressors or the code changed, on a process pool;
+    each result is written to the library in its own transaction as soon as it is done
+    :param ref_path: reference wind parameter path
+    :param library: RefLoadLibrary
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param enter_dir: the dir of file calling this function
+    :param max_workers: number of processes, default cpu count
+    :param progress: callback progress('references', done, total, name of the reference done)
+    :param platform: Platform the references are computed for, default the plain regressor folders;
+                     its regressor sets are never kept in the process store
+    :param regressors: (ultimate, fatigue) RegressorSet of the folders used in this process, e.g. those of a
+                       PlatformRegistry
+    :return: names of the references computed
+    """
+    version = model_version(regress_ul_folder, regress_fl_folder, platform)
+    missing = []
+    for path in ref_path:
+        name = os.path.splitext(os.path.split(path)[-1])[0]
+        meta = library.meta(name)
+        if meta is None or meta['digest'] != path_digest(path) or meta['version'] != version:
+            missing.append((name, path))
+    report(progress, 'references', 0, len(missing))
+    if len(missing) == 0:
+        return []
+
+    # compile the regressor store once before the workers load it
+    if regressors is None:
+        warm_regressors(regress_ul_folder, regress_fl_folder, cache=platform is None)
+
+    ref_worker = partial(ref_loads_worker, regress_ul_folder=regress_ul_folder,
+                         regress_fl_folder=regress_fl_folder, enter_dir=enter_dir, platform=platform)
+    max_workers = min(len(missing), max_workers or os.cpu_count() or 1)
+    if max_workers == 1:
+        if regressors is not None:
+            ref_worker = partial(ref_loads_worker, regress_ul_folder=regressors[0], regress_fl_folder=regressors[1],
+                                 enter_dir=enter_dir, platform=platform)
+        for done, (name, path) in enumerate(missing, 1):
+            ul, fl, digest = ref_worker(path)
+            library.put(name, ul, fl, source=path, digest=digest, version=version)
+            report(progress, 'references', done, len(missing), name)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(ref_worker, path): (name, path) for name, path in missing}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    name, path = futures[future]
+                    ul, fl, digest = future.result()
+                    library.put(name, ul, fl, source=path, digest=digest, version=version)
+                    report(progress, 'references', done, len(missing), name)
+            except BaseException:
+                # cancelled or failed, do not start the references still queued
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    return [name for name, _ in missing]
+
+
+def ref_loads_worker(path, regress_ul_folder, regress_fl_folder, enter_dir, platform=None):
+    """
+    Unnormalized loads of one reference wind, run in a worker process
+    :param regress_ul_folder: dir of ultimate load regressor, or its RegressorSet
+    :param regress_fl_folder: dir of fatigue load regressor, or its RegressorSet
+    :return: ultimate load, fatigue load, digest of the reference workbook
+    """
+    if platform is not None and isinstance(regress_ul_folder, str):
+        # platform sets stay out of the process store, whose memory is not bounded
+        regress_ul_folder = load_regressor(regress_ul_folder, UL_PATTERN, UL_NAME, cache=False)
+        regress_fl_folder = load_regressor(regress_fl_folder, FL_PATTERN, FL_NAME, cache=False)
+    wind = WindParse(cur_dir=enter_dir, path=path, ref_path=[])
+    wind.run()
+    wind_params = wind.pop()['cus']
+    loads = gen_loads(wind_params, [], enter_dir, regress_ul_folder, regress_fl_folder, normalize=False,
+                      executor=stage_executor(enter_dir), platform=platform)
+
+    return loads['ul'], loads['fl'], wind_params['digest']
+
+
+def warm_regressors(regress_ul_folder, regress_fl_folder, cache=True):
+    """
+    Load (and compile if needed) the ultimate and fatigue regressor sets into the process store
+    :param cache: False only compiles the binary stores, the sets are not kept in memory
+    """
+    load_regressor(regress_ul_folder, UL_PATTERN, UL_NAME, cache=cache)
+    load_regressor(regress_fl_folder, FL_PATTERN, FL_NAME, cache=cache)
+
+
+def model_version(regress_ul_folder, regress_fl_folder, platform=None):
+    """
+    Fingerprint of the regressor files, the platform settings and the code the loads are computed with
+    """
+    h = hashlib.sha1(code_version().encode('utf-8'))
+    h.update(path_digest(regress_ul_folder).encode('utf-8'))
+    h.update(path_digest(regress_fl_folder).encode('utf-8'))
+    if platform is not None:
+        h.update(platform.fingerprint().encode('utf-8'))
+
+    return h.hexdigest()
+
+
+def stage_executor(enter_dir):
+    """
+    Stage executor with the artifact cache of files/Cache/Stages
+    """
+    return StageExecutor(os.path.abspath(os.path.join(enter_dir, '../files/Cache/Stages')))
+
+
+def gen_loads(wind_outputs, ref_loads,
+              enter_dir, regress_ul_folder, regress_fl_folder, normalize=True, save_loads=False, executor=None,
+              keep_tables=False, platform=None, case_table=None):
+    """
+    Calculate loads(U,F) according to wind resource parameter and regressor
+    :param wind_outputs:
+    :param ref_loads: list of reference loads {'ul': pd.Series, 'fl': pd.Series}
+    :param enter_dir:
+    :param regress_ul_folder:
+    :param regress_fl_folder:
+    :param normalize: False for reference wind, loads are kept unnormalized
+    :param save_loads: True to write files/Loads/loads.xlsx, or a ResultSink the tables of loads_tables are
+                       appended to
+    :param executor: StageExecutor memoizing the models, models always run if None
+    :param keep_tables: True to return the turbine x dlc loads 'ul_dlc', 'fl_dlc' and the turbulence intensity
+                        'ti' as well
+    :param platform: Platform whose rated wind speed coefficients and cut-in / cut-out wind speeds are used,
+                     the regressors are still the folders (or RegressorSets) passed
+    :param case_table: FatigueCaseTable of the fatigue case proportion, default the table of models.fatigue_case
+    :return: {'ul': pd.Series, 'fl': pd.Series[, 'ul_dlc', 'fl_dlc', 'ti': turbine data frames]}
+    """
+    run = executor.run if executor is not None else (lambda model: model.run())
+
+    # turbine table shared by the models, each stage appends its output columns
+    table = TurbineTable.from_frame(wind_outputs['condition'].loc[wind_outputs['sites']], CONDITION)
+
+    ''' calc_rated_wind_speed model '''
+    calc_vr_inputs = OrderedDict(wind_condition=table.select(['θmean', 'α', 'ρ']))
+    if platform is not None:
+        calc_vr_inputs['regressor'] = platform.rated_regressor
+    calc_vr = CalcRatedWindSpeed(**calc_vr_inputs)
+    run(calc_vr)
+    table.join(calc_vr.pop())
+
+    ''' turbulence intensity interpolation '''
+    ti_inputs = dict(wind_outputs, rws=table.select(['rws']))
+    if platform is not None:
+        ti_inputs['cut_in'] = platform.cut_in
+    ti_interp = TiInterp(**ti_inputs)
+    run(ti_interp)
+    ti = ti_interp.pop()
+    table.join(ti)
+
+    ''' calculate load '''
+    cl_inputs = OrderedDict(ref_loads=ref_loads, u_folder=regress_ul_folder, f_folder=regress_fl_folder,
+                            ti=table, wind=wind_outputs, normalize=normalize)
+    if platform is not None:
+        cl_inputs['cut_out'] = platform.cut_out
+    if case_table is not None:
+        cl_inputs['case_table'] = case_table
+    keep_tables = keep_tables or isinstance(save_loads, ResultSink)
+    if keep_tables:
+        cl_inputs['keep_dlc'] = True
+    cl = CalcUltimateLoad(**cl_inputs)
+    run(cl)
+    loads = dict(cl.pop())
+    ultimate_load = loads['ul']
+    fatigue_load = loads['fl']
+    if keep_tables:
+        loads['ti'] = ti.to_frame()
+
+    if isinstance(save_loads, ResultSink):
+        for name, frame in loads_tables(loads, wind_outputs['sites']).items():
+            save_loads.write(name, frame)
+    elif save_loads:
+        save_path = os.path.abspath(os.path.join(enter_dir, '../files/Loads/loads.xlsx'))
+        with pd.ExcelWriter(save_path) as writer:
+            ultimate_load.to_excel(writer, sheet_name='Ultimate Load')
+            fatigue_load.to_excel(writer, sheet_name='Fatigue Load')
+    
+    return loads
+
+
+def loads_tables(loads, sites, **columns):
+    """
+    Result tables of one farm, rows of the farm turbines (reference rows are dropped)
+    :param loads: outputs of gen_loads with keep_tables
+    :param sites: turbine ids of the farm
+    :param columns: constant leading columns, e.g. farm='...'
+    :return: {'ul', 'fl', 'ul_dlc', 'fl_dlc', 'ti': data frame [*columns, turbine, ...]}
+    """
+    n_site = len(sites)
+    tables = {'ul': loads['ul'].iloc[:n_site].rename('ul').to_frame(),
+              'fl': loads['fl'].iloc[:n_site].rename('fl').to_frame()}
+    for name in ('ul_dlc', 'fl_dlc', 'ti'):
+        if name in loads:
+            tables[name] = loads[name]
+    for name, frame in tables.items():
+        frame = frame.reset_index(drop=True)
+        frame.insert(0, 'turbine', list(sites))
+        for i, (column, value) in enumerate(columns.items()):
+            frame.insert(i, column, value)
+        tables[name] = frame
+
+    return tables
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental run for interactive edits of a site wind parameter file
+
+The previous run is kept in memory; on the next run only the turbines whose site condition
+or turbulence columns changed go through CalcRatedWindSpeed, TiInterp and CalcUltimateLoad,
+and the maxima used for normalization are updated instead of recomputed. A change of the
+regressors or of the code recomputes every turbine, and reference loads recomputed in the
+library are reloaded.
+
+@author: 36719
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from wind_order.models import WindParse
+from wind_order.func_run.compute import gen_loads, prepare_refs, ref_library, report, model_version
+
+
+class IncrementalRun:
+    """
+    Incremental wind-order computation of one farm
+    :param enter_dir: the dir of file calling this function
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param max_workers: processes computing missing reference loads, default cpu count
+    :param chunk_size: turbines evaluated per chunk, progress is reported after each chunk
+    """
+
+    def __init__(self, enter_dir,
+                 regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+                 max_workers=None, chunk_size=2000):
+        self.enter_dir = enter_dir
+        self.regress_ul_folder = os.path.abspath(os.path.join(enter_dir, regress_ul_folder))
+        self.regress_fl_folder = os.path.abspath(os.path.join(enter_dir, regress_fl_folder))
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.library = ref_library(enter_dir)
+
+        self._wind = None           # wind parameters of the previous run
+        self._raw = {}              # {'ul'/'fl': unnormalized load by turbine}
+        self._site_max = {}         # {'ul'/'fl': (max, turbine)}
+        self._version = None        # model version the raw loads were computed with
+        self._ref_key = None        # reference names and their library metadata
+        self._ref_loads = []
+        self._ref_max = {'ul': -np.inf, 'fl': -np.inf}
+
+    def run(self, wind_path, ref_path, progress=None):
+        """
+        Normalized loads of the farm, recomputing only the turbines changed since the previous run
+        :param wind_path: farm wind parameter path
+        :param ref_path: reference wind parameter path
+        :param progress: callback progress(stage, done, total, result) of the stages 'references', 'parse',
+                         'turbines' and 'done' (result: the loads); the previous run is kept if it raises
+        :return: {'ul', 'fl', 'ref_labels', 'name'} as compute_loads, plus 'changed': turbines recomputed
+        """
+        prepare_refs(ref_path, self.library, self.regress_ul_folder, self.regress_fl_folder, self.enter_dir,
+                     self.max_workers, progress)
+        ref_names = [os.path.splitext(os.path.split(path)[-1])[0] for path in ref_path]
+        # a reference recomputed in the library (workbook, regressors or code changed) has new metadata
+        ref_key = [(name, self.library.meta(name)) for name in ref_names]
+        if ref_key != self._ref_key:
+            self._ref_key = ref_key
+            self._ref_loads = self.library.get(ref_names)
+            for key in ('ul', 'fl'):
+                self._ref_max[key] = max([ref[key].max() for ref in self._ref_loads], default=-np.inf)
+
+        report(progress, 'parse', 0, 1)
+        wind = WindParse(cur_dir=self.enter_dir, path=wind_path, ref_path=[])
+        wind.run()
+        wind_params = wind.pop()['cus']
+        report(progress, 'parse', 1, 1)
+
+        version = model_version(self.regress_ul_folder, self.regress_fl_folder)
+        if version != self._version:
+            # raw loads of other regressors or code, every turbine is recomputed
+            self._wind = None
+            self._raw = {}
+            self._site_max = {}
+        changed = self.__changed(wind_params)
+        sites = wind_params['sites']
+        report(progress, 'turbines', 0, len(changed))
+        loads = {'ul': [], 'fl': []}
+        for start in range(0, len(changed), self.chunk_size):
+            chunk = changed[start:start + self.chunk_size]
+            chunk_loads = gen_loads(self.__subset(wind_params, chunk), [], self.enter_dir,
+                                    self.regress_ul_folder, self.regress_fl_folder, normalize=False)
+            for key in ('ul', 'fl'):
+                loads[key].append(chunk_loads[key].loc[chunk].to_numpy())
+            report(progress, 'turbines', start + len(chunk), len(changed))
+        for key in ('ul', 'fl'):
+            old = self._raw.get(key, pd.Series(dtype=np.float64))
+            new = old.reindex(sites)
+            if len(changed) > 0:
+                new.loc[changed] = np.concatenate(loads[key])
+            self.__update_max(key, old, new, changed)
+            self._raw[key] = new
+        self._wind = wind_params
+        self._version = version
+
+        outputs = {'ref_labels': self.library.labels(ref_names), 'name': wind_params['filename'],
+                   'changed': changed}
+        for key, name in (('ul', 'UL1'), ('fl', 'FL1')):
+            load = pd.concat([self._raw[key]] + [ref[key] for ref in self._ref_loads])
+            load = load / max(self._site_max[key][0], self._ref_max[key])
+            load.name = name
+            outputs[key] = load
+        report(progress, 'done', 1, 1, outputs)
+
+        return outputs
+
+    def __update_max(self, key, old, new, changed):
+        """
+        Maximum of the farm after an edit, rescanning only if the previous maximum turbine decreased or left
+        """
+        value, turbine = self._site_max.get(key, (-np.inf, None))
+        if turbine is not None and (turbine not in new.index or
+                                    (turbine in changed and new[turbine] < old[turbine])):
+            value, turbine = -np.inf, None
+            changed = list(new.index)
+        if len(changed) > 0:
+            values = new.loc[changed]
+            if values.max() >= value:
+                value, turbine = values.max(), values.idxmax()
+        self._site_max[key] = (value, turbine)
+
+    def __changed(self, wind_params):
+        """
+        Turbines whose site condition or turbulence intensity columns differ from the previous run
+        """
+        sites = wind_params['sites']
+        prev = self._wind
+        if prev is None or list(wind_params['condition'].columns) != list(prev['condition'].columns):
+            return list(sites)
+        for table in ('m1', 'm10', 'etm'):
+            if not _same(wind_params[table]['Wind Speed'], prev[table]['Wind Speed']):
+                return list(sites)
+
+        common = [t for t in sites if t in set(prev['sites'])]
+        changed = set(sites) - set(common)
+        changed.update(_rows_changed(wind_params['condition'].loc[common], prev['condition'].loc[common]))
+        for table in ('m1', 'm10', 'etm'):
+            new = wind_params[table][common].reset_index(drop=True)
+            old = prev[table][common].reset_index(drop=True)
+            changed.update(_rows_changed(new.T, old.T))
+
+        return [t for t in sites if t in changed]
+
+    @staticmethod
+    def __subset(wind_params, turbines):
+        """
+        Wind parameters restricted to the turbines
+        """
+        subset = dict(wind_params)
+        subset['sites'] = list(turbines)
+        subset['condition'] = wind_params['condition'].loc[turbines]
+        for table in ('m1', 'm10', 'etm'):
+            subset[table] = wind_params[table][['Wind Speed'] + list(turbines)]
+
+        return subset
+
+
+def _same(a, b):
+    return len(a) == len(b) and bool(np.all((a.to_numpy() == b.to_numpy()) | (pd.isna(a.to_numpy()) &
+                                                                         pd.isna(b.to_numpy()))))
+
+
+def _rows_changed(new, old):
+    """
+    Index of the rows differing between two aligned frames, NaN equal to NaN
+    """
+    differ = (new != old) & ~(new.isna() & old.isna())
+
+    return list(new.index[differ.any(axis=1)])
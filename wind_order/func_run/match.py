@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Reference designs whose load envelopes cover a site
+
+@author: 36719
+"""
+
+import os
+from wind_order.models import WindParse
+from wind_order.models.ref_match import RefEnvelopeIndex
+from wind_order.func_run.compute import gen_loads, prepare_refs, ref_library, model_version, stage_executor
+
+
+def match_refs(enter_dir, wind_path, ref_path=(), top=None,
+               regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+               max_workers=None):
+    """
+    Reference designs of the load library covering every turbine of a farm, tightest first
+    :param enter_dir: the dir of file calling this function
+    :param wind_path: farm wind parameter path
+    :param ref_path: reference wind parameter paths added to (or refreshed in) the library first
+    :param top: number of references returned, default all covering references
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param max_workers: processes computing missing reference loads, default cpu count
+    :return: data frame [ul_envelope, fl_envelope, ul_margin, fl_margin, margin] by reference name;
+             only references computed with the current regressors and code are matched
+    """
+    regress_ul_folder = os.path.abspath(os.path.join(enter_dir, regress_ul_folder))
+    regress_fl_folder = os.path.abspath(os.path.join(enter_dir, regress_fl_folder))
+
+    library = ref_library(enter_dir)
+    prepare_refs(list(ref_path), library, regress_ul_folder, regress_fl_folder, enter_dir, max_workers)
+    index = RefEnvelopeIndex.from_library(library, version=model_version(regress_ul_folder, regress_fl_folder))
+
+    wind = WindParse(cur_dir=enter_dir, path=wind_path, ref_path=[])
+    wind.run()
+    loads = gen_loads(wind.pop()['cus'], [], enter_dir, regress_ul_folder, regress_fl_folder, normalize=False,
+                      executor=stage_executor(enter_dir))
+
+    return index.match(loads['ul'].to_numpy(), loads['fl'].to_numpy(), top)
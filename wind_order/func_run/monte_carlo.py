@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo propagation of site parameter uncertainty
+
+Perturbations of θmean, α, ρ, V50, K, A (added to the site values) and of the TI curves (factor)
+are sampled from user distributions, pushed through the vectorized load chain in batches, and
+the normalized UL/FL of every turbine are accumulated into streaming percentiles.
+
+@author: 36719
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from wind_order.models.scenario import PARAMS
+from wind_order.utils.quantile import StreamingQuantiles
+from wind_order.func_run.compute import prepare_refs, ref_library
+from wind_order.func_run.sweep import scenario_engine
+
+
+DISTRIBUTIONS = ('normal', 'uniform', 'lognormal', 'triangular', 'gamma', 'beta')
+
+
+def monte_carlo(enter_dir, wind_path, ref_path, distributions, n_samples=10000, seed=None,
+                percentiles=(50, 90, 99), per_turbine=False,
+                regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+                chunk_bytes=256 * 2 ** 20, bins=10000, engine=None):
+    """
+    Percentiles of normalized loads of every turbine under uncertain site parameters
+    :param enter_dir: the dir of file calling this function
+    :param wind_path: farm wind parameter path
+    :param ref_path: reference wind parameter path, loads are normalized as in compute_loads
+    :param distributions: {param: {'dist': numpy Generator method, **arguments}}, e.g.
+                          {'θmean': {'dist': 'normal', 'loc': 0, 'scale': 1},
+                           'TI': {'dist': 'normal', 'loc': 1, 'scale': 0.05}};
+                          θmean, α, ρ, V50, K, A samples are added to the site values, TI samples multiply the curves
+    :param n_samples: number of samples
+    :param seed: seed of the random generator, results are reproducible and independent of chunk_bytes
+    :param percentiles: percentiles reported
+    :param per_turbine: True to draw every turbine independently, False to perturb the whole farm alike
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param chunk_bytes: working memory bound of one batch of samples
+    :param bins: histogram bins of the normalized loads in [0, 1]
+    :param engine: ScenarioEngine to reuse, built from wind_path if None
+    :return: {'ul': data frame turbine x [P50, P90, P99, mean], 'fl': ..., 'n_samples', 'seed'}
+    """
+    unknown = set(distributions) - set(PARAMS)
+    if unknown:
+        raise KeyError(f'Unknown uncertain params {sorted(unknown)}, expected {list(PARAMS)}')
+    for p, spec in distributions.items():
+        if spec.get('dist') not in DISTRIBUTIONS:
+            raise ValueError(f'[{p}] distribution {spec.get("dist")!r} is not one of {DISTRIBUTIONS}')
+
+    if engine is None:
+        engine = scenario_engine(enter_dir, wind_path, regress_ul_folder, regress_fl_folder)
+
+    library = ref_library(enter_dir)
+    prepare_refs(ref_path, library, os.path.abspath(os.path.join(enter_dir, regress_ul_folder)),
+                 os.path.abspath(os.path.join(enter_dir, regress_fl_folder)), enter_dir)
+    ref_loads = library.get([os.path.splitext(os.path.split(path)[-1])[0] for path in ref_path])
+    ref_ul = max([ref['ul'].max() for ref in ref_loads], default=-np.inf)
+    ref_fl = max([ref['fl'].max() for ref in ref_loads], default=-np.inf)
+
+    # one stream per param, so the samples do not depend on the batch size
+    seed_seq = np.random.SeedSequence(seed)
+    streams = {p: np.random.default_rng(s) for p, s in zip(PARAMS, seed_seq.spawn(len(PARAMS)))}
+
+    n_turbine = len(engine.turbines)
+    ul_q = StreamingQuantiles(n_turbine, 0.0, 1.0, bins)
+    fl_q = StreamingQuantiles(n_turbine, 0.0, 1.0, bins)
+    base = {p: engine.base[p].to_numpy() for p in PARAMS}
+
+    step = max(1, chunk_bytes // (engine.row_bytes() * n_turbine))
+    for start in range(0, n_samples, step):
+        n = min(step, n_samples - start)
+        turbine = np.tile(np.arange(n_turbine), n)
+        values = {}
+        for p in PARAMS:
+            if p in distributions:
+                draw = _draw(streams[p], distributions[p], n * n_turbine if per_turbine else n)
+                draw = draw if per_turbine else np.repeat(draw, n_turbine)
+            else:
+                draw = np.full(n * n_turbine, 1.0 if p == 'TI' else 0.0)
+            values[p] = base[p][turbine] * draw if p == 'TI' else base[p][turbine] + draw
+
+        ul, fl = engine.evaluate(values, turbine)
+        ul = ul.reshape(n, n_turbine)
+        fl = fl.reshape(n, n_turbine)
+        ul_q.update(ul / np.maximum(ul.max(axis=1), ref_ul)[:, None])
+        fl_q.update(fl / np.maximum(fl.max(axis=1), ref_fl)[:, None])
+
+    return {'ul': _summary(ul_q, percentiles, engine.turbines), 'fl': _summary(fl_q, percentiles, engine.turbines),
+            'n_samples': n_samples, 'seed': seed}
+
+
+def _draw(rng, spec, size):
+    kwargs = {k: v for k, v in spec.items() if k != 'dist'}
+
+    return getattr(rng, spec['dist'])(size=size, **kwargs)
+
+
+def _summary(quantiles, percentiles, turbines):
+    table = pd.DataFrame({f'P{q:g}': quantiles.percentile(q) for q in percentiles}, index=turbines)
+    table['mean'] = quantiles.mean()
+
+    return table
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Refit the UL/FL regressors from a table of aeroelastic simulation results
+
+usage: python -m wind_order.func_run.refit sim_ul.parquet ../files/Regress_UL_new --load ul --template ../files/Regress_UL_01-39
+
+@author: 36719
+"""
+
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+from wind_order.models.regressor_fit import fit_regressor
+from wind_order.models.regressor_store import load_regressor, save_regressor
+from wind_order.models.calc_load import UL_PATTERN, FL_PATTERN, UL_NAME, FL_NAME
+
+
+LOADS = {'ul': (UL_PATTERN, UL_NAME), 'fl': (FL_PATTERN, FL_NAME)}
+
+
+def refit(enter_dir, cases, out_folder, load='ul', template_folder=None, ti_features=None, dlc_column='dlc'):
+    """
+    Fit the regressor of every DLC and write the folder CalcUltimateLoad loads
+    :param enter_dir: the dir of file calling this function
+    :param cases: simulation table (data frame or .csv/.parquet/.feather/.xlsx path), one row per simulated case
+                  with the dlc, wind condition, TI features and load channel columns
+    :param out_folder: folder of the refitted Regress_* workbooks, relative to enter_dir
+    :param load: 'ul' (UL_TB_Mxy of Regress_UL_*) or 'fl' (RF_TB_My_m4 of Regress_RF_Case*)
+    :param template_folder: regressor folder whose DLC and variables are refitted, default the best TI feature per dlc
+    :param ti_features: candidate TI feature columns without template
+    :param dlc_column: column of the DLC names
+    :return: RegressorSet, diagnostics data frame by dlc [cases, variables, ti_feature, r2, rmse, max_error, cond]
+    """
+    pattern, load_name = LOADS[load]
+    if isinstance(cases, str):
+        cases = read_cases(os.path.join(enter_dir, cases))
+    template = None
+    if template_folder is not None:
+        template = load_regressor(os.path.join(enter_dir, template_folder), pattern, load_name)
+
+    start = time.perf_counter()
+    reg_set, diagnostics = fit_regressor(cases, load_name, template, ti_features, dlc_column)
+    elapsed = time.perf_counter() - start
+    print(f'Tip: {len(reg_set)} regressors from {len(cases)} cases in {elapsed:.2f}s, '
+          f'worst r2 {diagnostics["r2"].min():.4f} ({diagnostics["r2"].idxmin()}).')
+
+    reg_set = save_regressor(reg_set, os.path.join(enter_dir, out_folder), pattern, load_name)
+
+    return reg_set, diagnostics
+
+
+def read_cases(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return pd.read_parquet(path)
+    if ext in ('.feather', '.arrow'):
+        return pd.read_feather(path)
+    if ext in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+
+    return pd.read_csv(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refit load regressors from simulation results')
+    parser.add_argument('cases', help='simulation table (.csv, .parquet, .feather, .xlsx)')
+    parser.add_argument('out', help='folder of the refitted regressor workbooks')
+    parser.add_argument('--load', default='ul', choices=list(LOADS), help='load channel fitted')
+    parser.add_argument('--template', default=None, help='regressor folder whose DLC and variables are refitted')
+    parser.add_argument('--dlc-column', default='dlc', help='column of the DLC names')
+    parser.add_argument('--diagnostics', default=None, help='csv file of the fit diagnostics')
+    args = parser.parse_args(argv)
+
+    _, diagnostics = refit(os.getcwd(), args.cases, args.out, args.load, args.template, dlc_column=args.dlc_column)
+    if args.diagnostics is not None:
+        diagnostics.to_csv(args.diagnostics)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
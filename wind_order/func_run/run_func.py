@@ -6,22 +6,26 @@ Main run
 """
 
 from functools import partial
-from collections import OrderedDict
-from wind_order.models import WindParse
-from wind_order.models import CalcRatedWindSpeed
-from wind_order.models import CalcUltimateLoad
-from wind_order.models import TiInterp
-import matplotlib.patches as mpatches
-import matplotlib.pyplot as plt
+from wind_order.func_run.compute import compute_loads
+from wind_order.utils import span
+from wind_order.utils.profiler import profiled
 import numpy as np
-import pandas as pd
-import json
-import os
-import re
+
+
+# bars with value labels above them; beyond, x labels are decimated to at most MAX_X_LABELS
+MAX_VALUE_LABELS = 60
+MAX_X_LABELS = 40
+# legend entries, further references are summed up in one entry
+MAX_LEGEND = 12
+FARM_COLOR = 'b'
+REF_COLORS = ['y', 'm', 'g', 'c', 'r', 'k']
+# tab20 entries for further references, without its blue pair (0, 1) too close to the farm bars
+EXTRA_COLORS = list(range(2, 20))
 
 
 def main_run(enter_dir, wind_path, ref_path,
-             regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123"):
+             regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+             max_workers=None, plot_path=None, platform=None):
     """
     wind-order startup function
     :param enter_dir: the dir of file calling this function
@@ -29,187 +33,171 @@ def main_run(enter_dir, wind_path, ref_path,
     :param ref_path: reference wind parameter path
     :param regress_ul_folder: dir of ultimate load regressor
     :param regress_fl_folder: dir of fatigue load regressor
+    :param max_workers: processes computing missing reference loads, default cpu count
+    :param plot_path: write the bar plot to this file (.png, .svg, .html) instead of showing it
+    :param platform: turbine platform id of files/platforms.json, its regressor folders replace
+                     regress_ul_folder / regress_fl_folder
     :return:
     """
-
-    custom_wind_name = os.path.splitext(os.path.split(wind_path)[-1])[0]
-    ref_path = ref_path
-
-    regress_ul_folder = os.path.abspath(os.path.join(enter_dir, regress_ul_folder))
-    regress_fl_folder = os.path.abspath(os.path.join(enter_dir, regress_fl_folder))
-
-    """ wind_parse model """
-    wind = WindParse(cur_dir=enter_dir, path=wind_path, ref_path=ref_path)
-    wind.run()
-    wind_outputs = wind.pop()
-
-    wind2loads = partial(gen_loads, enter_dir=enter_dir, regress_ul_folder=regress_ul_folder,
-                         regress_fl_folder=regress_fl_folder)
-
-    ref_loads = []
-    ref_loads_path = wind_outputs['ref_loads_path']
-    if len(ref_loads_path) > 0:
-        for i, ref in enumerate(wind_outputs['ref']):
-            if ref == 0:  # 参考风参对应的载荷存在
-                with open(ref_loads_path[i], 'r') as f:
-                    loads = json.load(f)
-                ref_loads.append(loads)
-            else:
-                ref_loads.append(wind2loads(wind_outputs['ref'][i], [], ref_loads_path[i]))
-        for ref in ref_loads:
-            ref['ul'] = pd.Series(ref['ul'])
-            ref['fl'] = pd.Series(ref['fl'])
-
-    cur_loads = wind2loads(wind_outputs['cus'], ref_loads, ref_loads_path, save_loads=False)
-    ultimate_load = cur_loads['ul']
-    fatigue_load = cur_loads['fl']
-
-    plt.close()
-    fig = plt.figure(figsize=(9, 5))
-    bar_plot = partial(draw, ref_loads_path=ref_loads_path, custom_wind_name=custom_wind_name)
-    bar_plot(fig, ultimate_load, 211)
-    bar_plot(fig, fatigue_load, 212)
-    plt.tight_layout()
-    fig.suptitle(custom_wind_name, y=1, fontsize=14, weight='bold')
-    plt.show()
+    with span('main_run', 'run'):
+        loads = compute_loads(enter_dir, wind_path, ref_path, regress_ul_folder, regress_fl_folder, max_workers,
+                              platform=platform)
+        plot_loads(loads, path=plot_path)
 
 
-def gen_loads(wind_outputs, ref_loads,  ref_loads_path,
-              enter_dir, regress_ul_folder, regress_fl_folder, save_loads=False):
+@profiled(name='plot_loads', cat='plot')
+def plot_loads(loads, path=None, show=None):
     """
-    Calculate loads(U,F) according to wind resource parameter and regressor
-    :param wind_outputs:
-    :param ref_loads:
-    :param ref_loads_path:
-    :param enter_dir:
-    :param regress_ul_folder:
-    :param regress_fl_folder:
-    :param save_loads:
-    :return:
+    bar plot of normalized loads
+    :param loads: {'ul', 'fl', 'ref_labels', 'name'} as returned by compute_loads
+    :param path: file the figure is written to, .png / .svg / .pdf or .html (inline svg)
+    :param show: show the figure with pyplot, default only if path is None
+    :return: figure
     """
-
-    ''' calc_rated_wind_speed model '''
-    calc_vr_inputs = OrderedDict(wind_condition=wind_outputs['condition'])
-    calc_vr = CalcRatedWindSpeed(**calc_vr_inputs)
-    calc_vr.run()
-
-    ''' turbulence intensity interpolation '''
-    ti_inputs = wind_outputs
-    ti_inputs['rws'] = calc_vr.pop()
-    ti_interp = TiInterp(**ti_inputs)
-    ti_interp.run()
-
-    ''' calculate load '''
-    cl_inputs = OrderedDict(ref_loads=ref_loads, u_folder=regress_ul_folder, f_folder=regress_fl_folder,
-                            ti=ti_interp.pop(), wind=wind_outputs, ref_loads_path=ref_loads_path)
-    cl = CalcUltimateLoad(**cl_inputs)
-    cl.run()
-    loads = cl.pop()
+    show = path is None if show is None else show
+    custom_wind_name = loads['name']
     ultimate_load = loads['ul']
     fatigue_load = loads['fl']
 
-    if save_loads:
-        save_path = os.path.abspath(os.path.join(enter_dir, '../files/Loads/loads.xlsx'))
-        with pd.ExcelWriter(save_path) as writer:
-            ultimate_load.to_excel(writer, sheet_name='Ultimate Load')
-            fatigue_load.to_excel(writer, sheet_name='Fatigue Load')
-    
-    return loads
+    if show:
+        import matplotlib.pyplot as plt
+        plt.close()
+        fig = plt.figure(figsize=(9, 5))
+    else:
+        # no pyplot state and no GUI backend for file output
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(9, 5))
+    bar_plot = partial(draw, ref_labels=loads['ref_labels'], custom_wind_name=custom_wind_name)
+    bar_plot(fig, ultimate_load, 211)
+    bar_plot(fig, fatigue_load, 212)
+    fig.tight_layout()
+    fig.suptitle(custom_wind_name, y=1, fontsize=14, weight='bold')
 
+    if path is not None:
+        save_figure(fig, path)
+    if show:
+        plt.show()
 
-def draw(fig, load, sub, ref_loads_path, custom_wind_name):
+    return fig
+
+
+def draw(fig, load, sub, ref_labels, custom_wind_name):
     """
-    plot bar
+    plot bar, all bars as one collection
     :param fig:
-    :param load:
+    :param load: normalized loads, farm turbines first then the reference turbines in the order of ref_labels
     :param sub:
-    :param ref_load_path:
+    :param ref_labels: {reference name: [turbine label]}
     :param custom_wind_name:
-    :return:
+    :return: axes
     """
-    fig.add_subplot(sub)
-
-    ref_labels = json_parse(ref_loads_path)
-
-    len_ref_label = lambda x: sum([len(list(v)) for v in x.values()])
-    raw_labels = list(load.index)[:-(len_ref_label(ref_labels))] if len(ref_labels) > 0 else list(load.index)
-
-    load_sorted = load.sort_values(ascending=False)
-
-    x_label, values, color_list, legend_handles = bar_config(load_sorted, custom_wind_name, raw_labels, ref_labels)
-
-    if len(x_label) < 10:
-        plt.bar(x_label, values, color=color_list, width=0.2)
-    else:
-        plt.bar(x_label, values, color=color_list)
+    from matplotlib.collections import PolyCollection
+
+    ax = fig.add_subplot(sub)
+
+    n_ref = sum(len(v) for v in ref_labels.values())
+    group = np.zeros(len(load), dtype=np.int64)
+    start = len(load) - n_ref
+    for i, ref_lbl in enumerate(ref_labels.values()):
+        group[start:start + len(ref_lbl)] = i + 1
+        start += len(ref_lbl)
+
+    order = np.argsort(-load.to_numpy(dtype=np.float64), kind='stable')
+    x_label, values, color_list, legend_handles = bar_config(load.iloc[order], custom_wind_name, group[order],
+                                                             ref_labels)
+
+    n = len(values)
+    # dense bars touch, sub-pixel gaps would alias into stripes
+    width = 0.2 if n < 10 else 0.8 if n < 200 else 1.0
+    x = np.arange(n, dtype=np.float64)
+    verts = np.empty((n, 4, 2))
+    verts[:, :, 0] = x[:, None] + np.array([-1, -1, 1, 1]) * width / 2
+    verts[:, :, 1] = np.column_stack([np.zeros(n), values, values, np.zeros(n)])
+    ax.add_collection(PolyCollection(verts, facecolors=color_list, edgecolors='none', antialiaseds=n < 200))
+    ax.set_xlim(-0.5, n - 0.5)
 
     y_label = {211: 'Ultimate_load', 212: 'Fatigue_load'}
-    plt.ylabel(y_label[sub])
+    ax.set_ylabel(y_label[sub])
 
-    y_ticks_min = max(round(min(values), 2) - 0.2, 0)
+    y_ticks_min = max(round(min(values), 2) - 0.2, 0) if n > 0 else 0
     y_ticks_max = 1.5
-    plt.ylim(y_ticks_min, y_ticks_max)
-    plt.yticks(np.arange(y_ticks_min, y_ticks_max, 0.2), fontsize=8)
+    ax.set_ylim(y_ticks_min, y_ticks_max)
+    ax.set_yticks(np.arange(y_ticks_min, y_ticks_max, 0.2))
+    ax.tick_params(axis='y', labelsize=8)
 
-    plt.legend(handles=legend_handles, ncol=len(ref_loads_path) + 1, fontsize='xx-small')
+    # fixed location, the 'best' location search scales with the number of bars
+    ax.legend(handles=legend_handles, ncol=min(len(legend_handles), 6), fontsize='xx-small', loc='upper right')
     # mode="expand"（平铺， 默认向右靠拢）  loc='upper right' (默认),
 
-    if len(x_label) > 5:
-        plt.xticks(rotation=45, horizontalalignment='right', size=6)
-    for a, b in zip(x_label, values):
-        plt.text(a, b + 0.005, '%.3f' % b, ha='center', va='bottom', fontsize=6)
+    step = max(1, int(np.ceil(n / MAX_X_LABELS)))
+    ax.set_xticks(x[::step])
+    if n > 5:
+        ax.set_xticklabels(x_label[::step], rotation=45, horizontalalignment='right', size=6)
+    else:
+        ax.set_xticklabels(x_label[::step])
+    if n <= MAX_VALUE_LABELS:
+        for a, b in zip(x, values):
+            ax.text(a, b + 0.005, '%.3f' % b, ha='center', va='bottom', fontsize=6)
+
+    return ax
 
 
-def bar_config(load_sorted, custom_wind_name, raw_labels, ref_labels):
+def bar_config(load_sorted, custom_wind_name, groups, ref_labels):
     """
     set bar plot attributes(color, label, legend)
     :param load_sorted:
     :param custom_wind_name:
-    :param raw_labels:
+    :param groups: group of every bar in load_sorted, 0 for the farm, i + 1 for the i-th reference
     :param ref_labels:
     :return:
     """
-    values = load_sorted.values
+    import matplotlib.patches as mpatches
+
+    values = load_sorted.to_numpy(dtype=np.float64)
 
-    sorted_labels = list(load_sorted.index)
-    show_labels = sorted_labels.copy()
+    palette = [FARM_COLOR] + [ref_color(i) for i in range(len(ref_labels))]
+    color_list = [palette[g] for g in groups]
 
-    colors = ['y', 'm', 'g', 'c', 'r', 'k', 'w']
-    color_list = []
-    for lbl in sorted_labels:
-        if lbl in raw_labels:
-            color_list.append('b')
-        else:
-            for i, ref_lbl in enumerate(list(ref_labels.values())):
-                if lbl in ref_lbl:
-                    color_list.append(colors[i])
+    # reference labels without the '<reference name>-' prefix
+    prefixes = [''] + [filename + '-' for filename in ref_labels]
+    show_labels = [str(lbl).replace(prefixes[g], '') if g > 0 else str(lbl)
+                   for lbl, g in zip(load_sorted.index, groups)]
 
     handles = list()
-    handles.append(mpatches.Patch(color='b', label=custom_wind_name))
-    for filename, ref_lbl in ref_labels.items():
-        handles.append(mpatches.Patch(color=color_list[sorted_labels.index(ref_lbl[0])], label=filename))
-        for i, lbl in enumerate(ref_lbl):
-            replaced_label = lbl.replace(filename + '-', '')
-            show_labels[sorted_labels.index(lbl)] = replaced_label
+    handles.append(mpatches.Patch(color=FARM_COLOR, label=custom_wind_name))
+    for i, filename in enumerate(ref_labels):
+        if len(ref_labels) >= MAX_LEGEND and i == MAX_LEGEND - 2:
+            handles.append(mpatches.Patch(color='none', label=f'+{len(ref_labels) - i} references'))
+            break
+        handles.append(mpatches.Patch(color=palette[i + 1], label=filename))
 
     return show_labels, values, color_list, handles
 
 
-def json_parse(ref_loads_path):
+def ref_color(i):
     """
-    count reference labels
-    :param ref_loads_path:
-    :return:
+    Bar color of the i-th reference, any number of references
     """
-    ref_labels = {}
-    if len(ref_loads_path) > 0:
-        for path in ref_loads_path:
-            with open(path, 'r') as f:
-                loads = json.load(f)
-                filename = os.path.splitext(os.path.split(path)[-1])[0][:-6]
-                ref_labels[filename] = list(loads['ul'].keys())
-
-    return ref_labels
+    if i < len(REF_COLORS):
+        return REF_COLORS[i]
+    from matplotlib import colormaps
+
+    return colormaps['tab20'](EXTRA_COLORS[(i - len(REF_COLORS)) % len(EXTRA_COLORS)])
+
+
+def save_figure(fig, path):
+    """
+    Write a figure by extension, .html embeds the svg in a page
+    """
+    if path.lower().endswith(('.html', '.htm')):
+        import io
+        buffer = io.StringIO()
+        fig.savefig(buffer, format='svg', bbox_inches='tight')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>wind-order</title></head>'
+                    '<body>\n' + buffer.getvalue() + '\n</body></html>\n')
+    else:
+        fig.savefig(path, bbox_inches='tight', dpi=150)
 
 
 # -- discarded --
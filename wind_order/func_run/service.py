@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Resident load query service
+
+Regressors, the fatigue case table and the reference loads are loaded once and stay in
+memory; site conditions are posted as JSON and the normalized UL/FL come back. Concurrent
+requests are collected into micro-batches: every request queued while the previous batch
+was evaluated (up to max_batch, optionally waiting max_wait seconds for more) runs the
+pipeline once for all of its turbines, and the loads are then normalized per request. An idle
+service answers at once, a busy one evaluates larger batches.
+
+usage: python -m wind_order.func_run.service -r ref1.xlsx ref2.xlsx --port 8765
+
+    POST /loads   {"sites": [turbine, ...],
+                   "condition": {"θmean": [...], "α": [...], "ρ": [...], "V50": [...], "K": [...], "A": [...]},
+                   "m1": {"Wind Speed": [...], turbine: [...], ...}, "m10": {...}, "etm": {...},
+                   "refs": [reference names, default all]}
+              -> {"ul": {turbine: value}, "fl": {turbine: value}, "scale": {"ul": ..., "fl": ...}}
+    GET  /health  -> request and batch counters
+
+θmean, α, ρ may be sent as inflow_angle, wind_shear, air_density. LoadClient wraps the
+protocol, site_payload builds the request of a WindParse output.
+
+@author: 36719
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import http.client
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from wind_order.models.regressor_store import load_regressor
+from wind_order.models.calc_load import UL_PATTERN, FL_PATTERN, UL_NAME, FL_NAME, REGRESSOR_CONDITION
+from wind_order.models.fatigue_case import DEFAULT_CASE_TABLE
+from wind_order.func_run.compute import gen_loads, prepare_refs, ref_library
+
+
+HOST = '127.0.0.1'
+PORT = 8765
+CONDITION = ['θmean', 'α', 'ρ', 'V50', 'K', 'A']
+TI_TABLES = ['m1', 'm10', 'etm']
+ALIASES = {v: k for k, v in REGRESSOR_CONDITION.items()}
+
+
+class LoadService:
+    """
+    Warm pipeline answering load queries in micro-batches
+    :param enter_dir: the dir the regressor and reference folders are relative to
+    :param ref_path: reference wind parameter paths kept in memory
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param max_batch: most requests evaluated together
+    :param max_wait: seconds a batch waits for more requests after the first, 0 takes the queued ones
+    """
+
+    def __init__(self, enter_dir, ref_path=(),
+                 regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+                 max_batch=64, max_wait=0.0):
+        self.enter_dir = enter_dir
+        regress_ul_folder = os.path.abspath(os.path.join(enter_dir, regress_ul_folder))
+        regress_fl_folder = os.path.abspath(os.path.join(enter_dir, regress_fl_folder))
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        library = ref_library(enter_dir)
+        prepare_refs(list(ref_path), library, regress_ul_folder, regress_fl_folder, enter_dir)
+        ref_names = [os.path.splitext(os.path.split(path)[-1])[0] for path in ref_path]
+        self.refs = dict(zip(ref_names, library.get(ref_names)))
+        self.ref_max = {name: (float(np.max(ref['ul'])), float(np.max(ref['fl']))) for name, ref in self.refs.items()}
+
+        # regressor sets are handed to the models directly, the folders are not checked again per query
+        self.regressor_ul = load_regressor(regress_ul_folder, UL_PATTERN, UL_NAME)
+        self.regressor_fl = load_regressor(regress_fl_folder, FL_PATTERN, FL_NAME)
+        self.case_table = DEFAULT_CASE_TABLE
+
+        self.counters = {'requests': 0, 'batches': 0, 'errors': 0}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='wind-order-batcher', daemon=True)
+                self._thread.start()
+
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def query(self, payload, timeout=None):
+        """
+        Normalized loads of one site, evaluated in the next micro-batch
+        :param payload: request dict, see the module doc
+        :return: {'ul': {turbine: value}, 'fl': {turbine: value}, 'scale': {'ul': max, 'fl': max}}
+        """
+        if self._thread is None:
+            self.start()
+        future = Future()
+        self._queue.put((payload, future))
+
+        return future.result(timeout)
+
+    def health(self):
+        with self._lock:
+            counters = dict(self.counters)
+        batches = counters['batches']
+        return dict(counters, refs=list(self.refs), mean_batch=counters['requests'] / batches if batches else 0.0)
+
+    def evaluate(self, payloads):
+        """
+        Loads of several requests with one pipeline run per wind speed grid
+        :return: list of results, or of the exception of the request
+        """
+        results = [None] * len(payloads)
+        groups = {}
+        for i, payload in enumerate(payloads):
+            try:
+                site = parse_payload(payload, self.refs)
+            except (KeyError, TypeError, ValueError) as e:
+                results[i] = ValueError(f'Bad request: {type(e).__name__}: {e}')
+                continue
+            groups.setdefault(site['grid'], []).append((i, site))
+
+        for members in groups.values():
+            try:
+                loads = self._evaluate_group([site for _, site in members])
+            except Exception as e:
+                # a bad request does not fail the others of the batch
+                loads = [self._evaluate_alone(site) for _, site in members] if len(members) > 1 else [e]
+            for (i, _), result in zip(members, loads):
+                results[i] = result
+
+        return results
+
+    def _evaluate_alone(self, site):
+        try:
+            return self._evaluate_group([site])[0]
+        except Exception as e:
+            return e
+
+    def _evaluate_group(self, sites):
+        keys = list(range(sum(len(site['sites']) for site in sites)))
+        condition = pd.DataFrame(np.vstack([site['condition'] for site in sites]), index=keys, columns=CONDITION)
+        wind_params = {'sites': keys, 'condition': condition, 'filename': 'service'}
+        for k, name in enumerate(TI_TABLES):
+            values = np.column_stack([sites[0]['grid'][k]] + [site[name] for site in sites])
+            wind_params[name] = pd.DataFrame(values, columns=['Wind Speed'] + keys)
+
+        loads = gen_loads(wind_params, [], self.enter_dir, self.regressor_ul, self.regressor_fl, normalize=False,
+                          case_table=self.case_table)
+        ul = loads['ul'].to_numpy()
+        fl = loads['fl'].to_numpy()
+
+        results = []
+        start = 0
+        for site in sites:
+            stop = start + len(site['sites'])
+            ul_max = max([float(ul[start:stop].max())] + [self.ref_max[name][0] for name in site['refs']])
+            fl_max = max([float(fl[start:stop].max())] + [self.ref_max[name][1] for name in site['refs']])
+            results.append({'ul': dict(zip(site['sites'], (ul[start:stop] / ul_max).tolist())),
+                            'fl': dict(zip(site['sites'], (fl[start:stop] / fl_max).tolist())),
+                            'scale': {'ul': ul_max, 'fl': fl_max}})
+            start = stop
+
+        return results
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            try:
+                results = self.evaluate([payload for payload, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            with self._lock:
+                self.counters['batches'] += 1
+                self.counters['requests'] += len(batch)
+                self.counters['errors'] += sum(isinstance(result, Exception) for result in results)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+def parse_payload(payload, refs):
+    """
+    Arrays of one request, TI tables sorted by wind speed
+    :return: {'sites', 'condition': (turbine, 6), 'm1'/'m10'/'etm': (speed, turbine), 'grid', 'refs'}
+    """
+    sites = list(payload['sites'])
+    if not sites:
+        raise ValueError('no turbine in sites')
+    condition = {ALIASES.get(k, k): v for k, v in payload['condition'].items()}
+    site = {'sites': sites,
+            'condition': np.column_stack([np.asarray(condition[c], dtype=np.float64) for c in CONDITION])}
+    if site['condition'].shape[0] != len(sites):
+        raise ValueError(f'{site["condition"].shape[0]} condition rows for {len(sites)} sites')
+
+    grid = []
+    for name in TI_TABLES:
+        table = payload[name]
+        x = np.asarray(table['Wind Speed'], dtype=np.float64)
+        y = np.column_stack([np.asarray([np.nan if v is None else v for v in table[str(t)]], dtype=np.float64)
+                             for t in sites])
+        if y.shape[0] != len(x):
+            raise ValueError(f'{name}: {y.shape[0]} turbulence rows for {len(x)} wind speeds')
+        order = np.argsort(x, kind='mergesort')
+        site[name] = y[order]
+        grid.append(tuple(x[order].tolist()))
+    site['grid'] = tuple(grid)
+
+    site['refs'] = list(payload.get('refs', refs))
+    unknown = [name for name in site['refs'] if name not in refs]
+    if unknown:
+        raise ValueError(f'unknown references {unknown}, the service holds {list(refs)}')
+
+    return site
+
+
+def site_payload(wind_params, refs=None):
+    """
+    Request of a farm, as WindParse outputs['cus']
+    :param refs: reference names the loads are normalized with, default all references of the service
+    """
+    sites = list(wind_params['sites'])
+    condition = wind_params['condition'].loc[sites]
+    payload = {'sites': [str(t) for t in sites],
+               'condition': {c: condition[c].astype(np.float64).tolist() for c in CONDITION}}
+    for name in TI_TABLES:
+        table = wind_params[name]
+        payload[name] = {'Wind Speed': table['Wind Speed'].astype(np.float64).tolist()}
+        for t in sites:
+            payload[name][str(t)] = [None if np.isnan(v) else v for v in table[t].astype(np.float64).tolist()]
+    if refs is not None:
+        payload['refs'] = list(refs)
+
+    return payload
+
+
+class LoadClient:
+    """
+    Client of a running service over one keep-alive connection (one client per thread)
+    """
+
+    def __init__(self, host=HOST, port=PORT, timeout=60):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def loads(self, site, refs=None):
+        """
+        Normalized loads of a farm
+        :param site: WindParse outputs['cus'] or a request dict
+        :return: {'ul': pd.Series, 'fl': pd.Series, 'scale': {'ul', 'fl'}}
+        """
+        payload = site if isinstance(site['condition'], dict) else site_payload(site, refs)
+        result = self._request('POST', '/loads', payload)
+
+        return {'ul': pd.Series(result['ul'], name='UL1'), 'fl': pd.Series(result['fl'], name='FL1'),
+                'scale': result['scale']}
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def close(self):
+        self.connection.close()
+
+    def _request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload).encode('utf-8')
+        self.connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = self.connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f'{response.status}: {data.get("error")}')
+
+        return data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service = None
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, self.service.health())
+        else:
+            self._reply(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/loads':
+            self._reply(404, {'error': f'unknown path {self.path}'})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            self._reply(200, self.service.query(payload))
+        except ValueError as e:
+            self._reply(400, {'error': str(e)})
+        except Exception as e:
+            self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(service, host=HOST, port=PORT):
+    """
+    HTTP server of a service, call serve_forever() (or run it in a thread) and shutdown()
+    :return: ThreadingHTTPServer
+    """
+    handler = type('LoadHandler', (_Handler,), {'service': service.start()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resident load query service')
+    parser.add_argument('-r', '--ref', nargs='*', default=[], help='reference wind parameter files')
+    parser.add_argument('-d', '--enter-dir', default=os.getcwd(),
+                        help='dir the regressor and Loads folders are relative to (../files)')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-batch', type=int, default=64, help='most requests evaluated together')
+    parser.add_argument('--max-wait', type=float, default=0.0, help='seconds a batch waits for more requests')
+    parser.add_argument('--ul', default="../files/Regress_UL_01-39", help='dir of ultimate load regressor')
+    parser.add_argument('--fl', default="../files/Regress_FL_001-123", help='dir of fatigue load regressor')
+    args = parser.parse_args(argv)
+
+    service = LoadService(args.enter_dir, args.ref, args.ul, args.fl, args.max_batch, args.max_wait)
+    server = serve(service, args.host, args.port)
+    print(f'Tip: serving loads on http://{args.host}:{server.server_port}, {len(service.refs)} references.')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+What-if sweep of site parameters
+
+The farm workbook and the regressors are loaded once; every scenario perturbs θmean, α, ρ,
+V50, K, A of all turbines (added to the site value) and scales the turbulence curves (TI
+factor). Scenarios are evaluated in chunks of (scenario, turbine) rows bounded in memory.
+
+@author: 36719
+"""
+
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from wind_order.models import WindParse
+from wind_order.models.scenario import ScenarioEngine, PARAMS
+from wind_order.models.regressor_store import load_regressor
+from wind_order.models.calc_load import UL_PATTERN, FL_PATTERN, UL_NAME, FL_NAME
+
+
+def sweep(enter_dir, wind_path, grid=None, scenarios=None,
+          regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123",
+          chunk_bytes=256 * 2 ** 20, engine=None):
+    """
+    Unnormalized UL max and FL equivalence of every turbine under every scenario
+    :param enter_dir: the dir of file calling this function
+    :param wind_path: farm wind parameter path
+    :param grid: {param: perturbations}, scenarios are the cartesian product;
+                 θmean, α, ρ, V50, K, A are added to the site values, TI multiplies the turbulence curves
+    :param scenarios: list of {param: perturbation} or data frame of perturbations, used instead of grid
+    :param regress_ul_folder: dir of ultimate load regressor
+    :param regress_fl_folder: dir of fatigue load regressor
+    :param chunk_bytes: working memory bound of one chunk of rows
+    :param engine: ScenarioEngine to reuse, built from wind_path if None
+    :return: {'scenarios': data frame scenario x param, 'turbines': [turbine],
+              'ul': scenario x turbine array, 'fl': scenario x turbine array}
+    """
+    if engine is None:
+        engine = scenario_engine(enter_dir, wind_path, regress_ul_folder, regress_fl_folder)
+    table = scenario_table(grid, scenarios)
+
+    n_turbine = len(engine.turbines)
+    ul = np.empty((len(table), n_turbine), dtype=np.float64)
+    fl = np.empty((len(table), n_turbine), dtype=np.float64)
+    deltas = {p: table[p].to_numpy(dtype=np.float64) for p in PARAMS}
+    base = {p: engine.base[p].to_numpy() for p in PARAMS}
+
+    step = max(1, chunk_bytes // (engine.row_bytes() * n_turbine))
+    for start in range(0, len(table), step):
+        stop = min(start + step, len(table))
+        scenario = np.repeat(np.arange(start, stop), n_turbine)
+        turbine = np.tile(np.arange(n_turbine), stop - start)
+        values = {p: base[p][turbine] + deltas[p][scenario] for p in PARAMS if p != 'TI'}
+        values['TI'] = deltas['TI'][scenario]
+        chunk_ul, chunk_fl = engine.evaluate(values, turbine)
+        ul[start:stop] = chunk_ul.reshape(stop - start, n_turbine)
+        fl[start:stop] = chunk_fl.reshape(stop - start, n_turbine)
+
+    return {'scenarios': table, 'turbines': engine.turbines, 'ul': ul, 'fl': fl}
+
+
+def scenario_engine(enter_dir, wind_path,
+                    regress_ul_folder="../files/Regress_UL_01-39", regress_fl_folder="../files/Regress_FL_001-123"):
+    """
+    ScenarioEngine of a farm with the compiled regressors
+    """
+    wind = WindParse(cur_dir=enter_dir, path=wind_path, ref_path=[])
+    wind.run()
+    wind_params = wind.pop()['cus']
+    regressor_ul = load_regressor(os.path.abspath(os.path.join(enter_dir, regress_ul_folder)), UL_PATTERN, UL_NAME)
+    regressor_fl = load_regressor(os.path.abspath(os.path.join(enter_dir, regress_fl_folder)), FL_PATTERN, FL_NAME)
+
+    return ScenarioEngine(wind_params, regressor_ul, regressor_fl)
+
+
+def scenario_table(grid=None, scenarios=None):
+    """
+    Scenario x param table of perturbations, 0 (TI: 1) for the params not given
+    """
+    default = {p: 1.0 if p == 'TI' else 0.0 for p in PARAMS}
+    if scenarios is not None:
+        table = pd.DataFrame(scenarios)
+    elif grid:
+        unknown = set(grid) - set(PARAMS)
+        if unknown:
+            raise KeyError(f'Unknown sweep params {sorted(unknown)}, expected {list(PARAMS)}')
+        names = list(grid)
+        table = pd.DataFrame(list(itertools.product(*[np.atleast_1d(grid[p]) for p in names])), columns=names)
+    else:
+        table = pd.DataFrame([default])
+
+    for p in PARAMS:
+        if p not in table.columns:
+            table[p] = default[p]
+        else:
+            table[p] = table[p].fillna(default[p])
+
+    return table[list(PARAMS)].astype(np.float64)
+
+
+def sweep_frame(result):
+    """
+    Tidy data frame of a sweep result, one row per (scenario, turbine)
+    :return: data frame [scenario, θmean, α, ρ, V50, K, A, TI, turbine, ul, fl]
+    """
+    n_scenario, n_turbine = result['ul'].shape
+    frame = result['scenarios'].iloc[np.repeat(np.arange(n_scenario), n_turbine)].reset_index(names='scenario')
+    frame['turbine'] = np.tile(np.asarray(result['turbines'], dtype=object), n_scenario)
+    frame['ul'] = result['ul'].ravel()
+    frame['fl'] = result['fl'].ravel()
+
+    return frame
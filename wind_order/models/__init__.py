@@ -1,5 +1,26 @@
-from .base_model import Base
-from .wind_parse import WindParse
-from .calc_vr import CalcRatedWindSpeed
-from .ti_interp import TiInterp
-from .calc_load import CalcUltimateLoad
+import importlib
+
+_LAZY = {
+    'Base': '.base_model',
+    'WindParse': '.wind_parse',
+    'CalcRatedWindSpeed': '.calc_vr',
+    'TiInterp': '.ti_interp',
+    'CalcUltimateLoad': '.calc_load',
+    'TurbineTable': '.turbine_table',
+    'Platform': '.platform',
+    'PlatformRegistry': '.platform',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
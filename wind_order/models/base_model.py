@@ -5,10 +5,23 @@ Base class inherited by all calculation models
 @author: 36719
 """
 
+import functools
 from collections import OrderedDict
+from wind_order.utils import profiler
 
 
 class Base:
+    # outputs depend only on inputs, the model may be memoized by StageExecutor
+    cacheable = True
+    # inputs holding file or folder paths, fingerprinted by content
+    path_inputs = ()
+
+    def __init_subclass__(cls, **kwargs):
+        # every run() of a model is a span of the active profiler
+        super().__init_subclass__(**kwargs)
+        if 'run' in cls.__dict__:
+            cls.run = _profiled_run(cls.__dict__['run'])
+
     def __init__(self, **inputs):
         # Dictionary of inputs
         self._inputs = OrderedDict(**inputs)
@@ -43,3 +56,14 @@ class Base:
         :return:
         """
         return self._outputs
+
+
+def _profiled_run(run):
+    @functools.wraps(run)
+    def wrapper(self):
+        if profiler._PROFILER is None:
+            return run(self)
+        with profiler._PROFILER.span(self.model_type(), 'model'):
+            return run(self)
+
+    return wrapper
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Proportion of fatigue cases from the Weibull wind speed distribution
+
+The case table is data: every entry is a group of consecutive fatigue cases, either a
+wind speed bin {'lower', 'upper', 'cases'} whose Weibull probability is shared equally by
+its cases ('upper': 'end' stands for the end wind speed of the turbine), or a fixed
+proportion {'p', 'cases'} (idling, start/stop, fault). The groups are in the order of the
+Regress_RF_Case* files.
+
+@author: 36719
+"""
+
+import json
+import numpy as np
+
+
+FATIGUE_CASE_TABLE = (
+    # power production, 2m/s bins from 3m/s to 17m/s, 6 cases each (Case001 - Case048)
+    {'lower': 2, 'upper': 4, 'cases': 6},
+    {'lower': 4, 'upper': 6, 'cases': 6},
+    {'lower': 6, 'upper': 8, 'cases': 6},
+    {'lower': 8, 'upper': 10, 'cases': 6},
+    {'lower': 10, 'upper': 12, 'cases': 6},
+    {'lower': 12, 'upper': 14, 'cases': 6},
+    {'lower': 14, 'upper': 16, 'cases': 6},
+    {'lower': 16, 'upper': 18, 'cases': 6},
+    # power production at 19m/s and 20m/s
+    {'lower': 18, 'upper': 19.5, 'cases': 6},
+    {'lower': 19.5, 'upper': 21, 'cases': 6},
+    # idling, start and stop, fault
+    {'p': 9.50644441867142E-07, 'cases': 24},
+    {'p': 1.90128888373428E-06, 'cases': 24},
+    {'p': 0.001901289, 'cases': 1},
+    {'p': 9.50644E-05, 'cases': 2},
+    # parked below cut-in and above cut-out
+    {'lower': 0, 'upper': 2, 'cases': 6},
+    {'lower': 21, 'upper': 'end', 'cases': 6},
+)
+
+
+class FatigueCaseTable:
+    """
+    Case table compiled to arrays once, evaluated for all turbines in one array operation
+    :param table: sequence of case groups, see FATIGUE_CASE_TABLE
+    """
+
+    def __init__(self, table=FATIGUE_CASE_TABLE):
+        self.table = tuple(table)
+        is_bin = np.array(['p' not in g for g in self.table], dtype=bool)
+        self.is_bin = is_bin
+        self.is_end = np.array([g.get('upper') == 'end' for g in self.table], dtype=bool)
+        self.lower = np.array([g['lower'] if b else 0 for g, b in zip(self.table, is_bin)], dtype=np.float64)
+        self.upper = np.array([g['upper'] if b and not e else 0 for g, b, e in
+                               zip(self.table, is_bin, self.is_end)], dtype=np.float64)
+        self.p = np.array([0 if b else g['p'] for g, b in zip(self.table, is_bin)], dtype=np.float64)
+        self.cases = np.array([g['cases'] for g in self.table], dtype=np.int64)
+
+    def __len__(self):
+        return int(self.cases.sum())
+
+    def proportion(self, k, a, v50, cut_out=20):
+        """
+        Proportion of every fatigue case
+        :param k: Weibull shape parameter of every turbine
+        :param a: Weibull scale parameter of every turbine
+        :param v50: extreme wind speed of every turbine
+        :param cut_out: cut-out wind speed
+        :return: turbine x case matrix
+        """
+        k = np.asarray(k, dtype=np.float64)[:, None]
+        a = np.asarray(a, dtype=np.float64)[:, None]
+        v50 = np.asarray(v50, dtype=np.float64)[:, None]
+
+        wind_end = np.where(0.7 * v50 > cut_out + 1, 0.7 * v50, cut_out + 2)
+        upper = np.where(self.is_end, wind_end, self.upper)
+
+        cdf_end = weibull_cdf(wind_end, k, a)
+        p_bin = (weibull_cdf(upper, k, a) - weibull_cdf(self.lower, k, a)) / self.cases / cdf_end
+        p_group = np.where(self.is_bin, p_bin, self.p)
+
+        return np.repeat(p_group, self.cases, axis=1)
+
+
+DEFAULT_CASE_TABLE = FatigueCaseTable()
+
+
+def weibull_cdf(x, alpha, beta):
+    """
+    Weibull Cumulative distribution function
+    :param x:
+    :param alpha:  shape parameter
+    :param beta:  scale parameter
+    :return cum_dist:
+    """
+    return 1 - np.exp(-(x / beta) ** alpha)
+
+
+def load_case_table(path):
+    """
+    Case table from a json file, a list of case groups as in FATIGUE_CASE_TABLE
+    :param path:
+    :return: FatigueCaseTable
+    """
+    with open(path, 'r') as f:
+        return FatigueCaseTable(json.load(f))
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of turbine platforms
+
+A platform (rotor / hub height variant) has its own rated wind speed coefficients, UL/FL
+regressor folders and cut-in / cut-out wind speeds. Platforms are registered by id, in code
+or from a JSON file:
+
+    {"platforms": {"GW-155-4.5-100": {"ul_folder": "Regress_UL_155", "fl_folder": "Regress_FL_155",
+                                      "rated_regressor": {"const": ..., "inflow_angle": ..., ...},
+                                      "cut_in": 3, "cut_out": 20, "description": "..."}}}
+
+Regressor folders are relative to the JSON file. The regressor sets of a platform are loaded
+on first use and kept in an LRU bounded by max_bytes, so a process serving many platforms
+only keeps the recently used ones resident; a set shared by several platforms is held once.
+
+@author: 36719
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from .calc_vr import RATED_REGRESSOR
+from .calc_load import UL_PATTERN, FL_PATTERN, UL_NAME, FL_NAME
+from .regressor_store import load_regressor, is_current
+
+
+DEFAULT_PLATFORM = 'default'
+MAX_BYTES = 256 * 2 ** 20
+
+
+class Platform:
+    """
+    Settings of one turbine platform
+    :param platform_id: id of the platform
+    :param ul_folder: dir of ultimate load regressor
+    :param fl_folder: dir of fatigue load regressor
+    :param rated_regressor: coefficients of rated wind speed, {'const', 'inflow_angle', 'wind_shear', 'air_density'}
+    :param cut_in: cut-in wind speed, m/s
+    :param cut_out: cut-out wind speed of the fatigue case proportion, m/s
+    :param description: free text
+    """
+
+    def __init__(self, platform_id, ul_folder, fl_folder, rated_regressor=None, cut_in=3, cut_out=20,
+                 description=''):
+        self.platform_id = platform_id
+        self.ul_folder = os.path.abspath(ul_folder)
+        self.fl_folder = os.path.abspath(fl_folder)
+        self.rated_regressor = dict(rated_regressor or RATED_REGRESSOR)
+        self.cut_in = cut_in
+        self.cut_out = cut_out
+        self.description = description
+
+    def fingerprint(self):
+        """
+        Digest of the settings other than the regressor files
+        """
+        settings = [self.platform_id, sorted(self.rated_regressor.items()), self.cut_in, self.cut_out]
+
+        return hashlib.sha1(json.dumps(settings).encode('utf-8')).hexdigest()
+
+    def __repr__(self):
+        return f'Platform({self.platform_id!r}, cut_in={self.cut_in}, cut_out={self.cut_out})'
+
+
+class PlatformRegistry:
+    """
+    Platforms by id, with their regressor sets loaded lazily into a memory-bounded LRU
+    :param max_bytes: most bytes of regressor sets kept resident; the set in use is always kept
+    :param check_files: reload a resident set when its workbooks changed (one stat per workbook and use)
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, check_files=True):
+        self.max_bytes = max_bytes
+        self.check_files = check_files
+        self._platforms = {}
+        self._sets = OrderedDict()  # {(folder, pattern, load name): RegressorSet}, least recently used first
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+    @classmethod
+    def from_config(cls, path, max_bytes=MAX_BYTES, check_files=True):
+        """
+        Registry of the platforms of a JSON file
+        """
+        registry = cls(max_bytes, check_files)
+        registry.read_config(path)
+
+        return registry
+
+    def read_config(self, path):
+        """
+        Register the platforms of a JSON file, folders are relative to the file
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        for platform_id, settings in config.get('platforms', {}).items():
+            settings = dict(settings)
+            settings['ul_folder'] = os.path.join(folder, settings['ul_folder'])
+            settings['fl_folder'] = os.path.join(folder, settings['fl_folder'])
+            self.register(platform_id, **settings)
+
+    def register(self, platform_id, ul_folder, fl_folder, rated_regressor=None, cut_in=3, cut_out=20,
+                 description=''):
+        """
+        Add or replace a platform, its regressors are not loaded yet
+        :return: Platform
+        """
+        platform = Platform(platform_id, ul_folder, fl_folder, rated_regressor, cut_in, cut_out, description)
+        with self._lock:
+            self._platforms[platform_id] = platform
+
+        return platform
+
+    def __contains__(self, platform_id):
+        return platform_id in self._platforms
+
+    def __iter__(self):
+        return iter(list(self._platforms))
+
+    def __len__(self):
+        return len(self._platforms)
+
+    def get(self, platform_id):
+        """
+        :return: Platform
+        """
+        try:
+            return self._platforms[platform_id]
+        except KeyError:
+            raise KeyError(f'Unknown platform {platform_id!r}, registered: {list(self._platforms)}') from None
+
+    def regressors(self, platform_id):
+        """
+        Ultimate and fatigue regressor sets of a platform, loaded on first use
+        :return: RegressorSet of ultimate load, RegressorSet of fatigue load
+        """
+        platform = self.get(platform_id)
+        with self._lock:
+            ul = self._regressor(platform.ul_folder, UL_PATTERN, UL_NAME)
+            fl = self._regressor(platform.fl_folder, FL_PATTERN, FL_NAME)
+            self._shrink(keep={id(ul), id(fl)})
+
+        return ul, fl
+
+    def resident(self):
+        """
+        Regressor folders currently kept in memory, least recently used first
+        """
+        return [key[0] for key in self._sets]
+
+    def nbytes(self):
+        return sum(reg_set.nbytes() for reg_set in self._sets.values())
+
+    def evict(self, platform_id=None):
+        """
+        Drop the regressor sets of a platform, or of all platforms
+        """
+        with self._lock:
+            if platform_id is None:
+                self._sets.clear()
+                return
+            platform = self.get(platform_id)
+            for key in list(self._sets):
+                if key[0] in (platform.ul_folder, platform.fl_folder):
+                    del self._sets[key]
+
+    def _regressor(self, folder, pattern, load_name):
+        key = (folder, pattern.pattern, load_name)
+        reg_set = self._sets.get(key)
+        if reg_set is not None and (not self.check_files or is_current(reg_set, folder, pattern)):
+            self._sets.move_to_end(key)
+            self.stats['hits'] += 1
+            return reg_set
+
+        # not kept in the process-wide store, the registry bounds the memory of the sets
+        reg_set = load_regressor(folder, pattern, load_name, cache=False)
+        self._sets.pop(key, None)
+        self._sets[key] = reg_set
+        self.stats['loads'] += 1
+
+        return reg_set
+
+    def _shrink(self, keep):
+        total = self.nbytes()
+        for key in list(self._sets):
+            if total <= self.max_bytes:
+                break
+            reg_set = self._sets[key]
+            if id(reg_set) in keep:
+                continue
+            total -= reg_set.nbytes()
+            del self._sets[key]
+            self.stats['evictions'] += 1
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Indexed library of reference design loads
+
+One SQLite file holds the unnormalized UL/FL of every turbine position of every reference
+design plus metadata. References are loaded lazily and selectively by name, their turbine
+labels are kept in one in-memory index shared by normalization and plotting.
+
+@author: 36719
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import closing
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    name TEXT PRIMARY KEY,
+    source TEXT,
+    digest TEXT,
+    created REAL,
+    n_turbine INTEGER,
+    version TEXT
+);
+CREATE TABLE IF NOT EXISTS loads (
+    ref TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    turbine TEXT NOT NULL,
+    ul REAL,
+    fl REAL,
+    PRIMARY KEY (ref, pos)
+);
+"""
+
+
+class RefLoadLibrary:
+    """
+    Reference load library
+    :param path: path of the sqlite file, created on first use
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._labels = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._connect()) as con:
+            con.executescript(SCHEMA)
+            if 'version' not in [row[1] for row in con.execute('PRAGMA table_info(refs)')]:
+                con.execute('ALTER TABLE refs ADD COLUMN version TEXT')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    def __contains__(self, name):
+        with closing(self._connect()) as con:
+            return con.execute('SELECT 1 FROM refs WHERE name = ?', (name,)).fetchone() is not None
+
+    def names(self):
+        with closing(self._connect()) as con:
+            return [row[0] for row in con.execute('SELECT name FROM refs ORDER BY name')]
+
+    def meta(self, name):
+        """
+        Metadata of a reference design, None if missing
+        """
+        with closing(self._connect()) as con:
+            row = con.execute('SELECT source, digest, created, n_turbine, version FROM refs WHERE name = ?',
+                              (name,)).fetchone()
+        if row is None:
+            return None
+
+        return dict(zip(['source', 'digest', 'created', 'n_turbine', 'version'], row))
+
+    def put(self, name, ul, fl, source='', digest='', version=''):
+        """
+        Insert or replace the loads of a reference design in one transaction
+        :param name: reference name (workbook name without extension)
+        :param ul: pd.Series of unnormalized ultimate load by turbine
+        :param fl: pd.Series of unnormalized fatigue load equivalence by turbine
+        :param source: path of the reference workbook
+        :param digest: content hash of the reference workbook
+        :param version: fingerprint of the regressors and code the loads were computed with
+        """
+        fl = fl.reindex(ul.index)
+        rows = [(name, pos, str(turbine), float(u), float(f))
+                for pos, (turbine, u, f) in enumerate(zip(ul.index, ul.values, fl.values))]
+        with closing(self._connect()) as con:
+            with con:
+                con.execute('DELETE FROM loads WHERE ref = ?', (name,))
+                con.executemany('INSERT INTO loads VALUES (?, ?, ?, ?, ?)', rows)
+                con.execute('INSERT OR REPLACE INTO refs (name, source, digest, created, n_turbine, version) '
+                            'VALUES (?, ?, ?, ?, ?, ?)', (name, source, digest, time.time(), len(rows), version))
+        with self._lock:
+            self._labels[name] = [row[2] for row in rows]
+
+    def get(self, names):
+        """
+        Loads of the selected reference designs
+        :param names: reference names
+        :return: list of {'ul': pd.Series, 'fl': pd.Series} in the order of names
+        """
+        ref_loads = []
+        with closing(self._connect()) as con:
+            for name in names:
+                rows = con.execute('SELECT turbine, ul, fl FROM loads WHERE ref = ? ORDER BY pos',
+                                   (name,)).fetchall()
+                if not rows and name not in self:
+                    raise KeyError(f'Reference [{name}] is not in the load library')
+                turbines = [row[0] for row in rows]
+                ref_loads.append({'ul': pd.Series([row[1] for row in rows], index=turbines, dtype=float),
+                                  'fl': pd.Series([row[2] for row in rows], index=turbines, dtype=float)})
+                with self._lock:
+                    self._labels[name] = turbines
+
+        return ref_loads
+
+    def labels(self, names):
+        """
+        Turbine labels of the selected reference designs from the in-memory index
+        :return: {reference name: [turbine label]}
+        """
+        missing = [name for name in names if name not in self._labels]
+        if missing:
+            with closing(self._connect()) as con:
+                for name in missing:
+                    turbines = [row[0] for row in con.execute(
+                        'SELECT turbine FROM loads WHERE ref = ? ORDER BY pos', (name,))]
+                    with self._lock:
+                        self._labels[name] = turbines
+
+        return {name: self._labels[name] for name in names}
+
+    def envelopes(self, names=None, version=None):
+        """
+        Maximum UL and FL over the turbine positions of the references, computed in the database
+        :param names: references, default all
+        :param version: only references computed with this model version
+        :return: {reference name: (ul envelope, fl envelope)}
+        """
+        query = 'SELECT l.ref, MAX(l.ul), MAX(l.fl) FROM loads l JOIN refs r ON r.name = l.ref'
+        params = ()
+        if version is not None:
+            query += ' WHERE r.version = ?'
+            params = (version,)
+        with closing(self._connect()) as con:
+            rows = con.execute(query + ' GROUP BY l.ref', params).fetchall()
+        if names is not None:
+            names = set(names)
+            rows = [row for row in rows if row[0] in names]
+
+        return {name: (ul, fl) for name, ul, fl in rows}
+
+    def remove(self, name):
+        with closing(self._connect()) as con:
+            with con:
+                con.execute('DELETE FROM loads WHERE ref = ?', (name,))
+                con.execute('DELETE FROM refs WHERE name = ?', (name,))
+        with self._lock:
+            self._labels.pop(name, None)
+
+    def import_json(self, folder):
+        """
+        Import legacy <name>_loads.json files of a folder which are not in the library yet
+        :param folder: folder of json files
+        :return: names imported
+        """
+        imported = []
+        if not os.path.isdir(folder):
+            return imported
+
+        known = set(self.names())
+        for file in sorted(os.listdir(folder)):
+            if not file.endswith('_loads.json'):
+                continue
+            name = file[:-len('_loads.json')]
+            path = os.path.join(folder, file)
+            if name in known or not os.path.getsize(path):
+                continue
+            with open(path, 'r') as f:
+                loads = json.load(f)
+            self.put(name, pd.Series(loads['ul'], dtype=float), pd.Series(loads['fl'], dtype=float), source=path)
+            imported.append(name)
+
+        return imported
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Reference designs indexed by their UL/FL envelopes
+
+The envelope of a reference design is the maximum unnormalized UL and FL over its turbine
+positions. A reference covers a site when both envelopes are at least the site maxima, i.e.
+it covers every turbine. References are kept sorted by UL envelope, so a query bisects to the
+references whose UL envelope is high enough and filters their FL envelope in one array
+operation, instead of concatenating and scanning every reference.
+
+@author: 36719
+"""
+
+import bisect
+import numpy as np
+import pandas as pd
+
+
+class RefEnvelopeIndex:
+    """
+    Sorted index of reference envelopes
+    :param envelopes: {reference name: (ul envelope, fl envelope)}
+    """
+
+    def __init__(self, envelopes=None):
+        self._env = {name: (float(ul), float(fl)) for name, (ul, fl) in (envelopes or {}).items()}
+        order = sorted(self._env, key=lambda name: self._env[name][0])
+        self._names = order
+        self._ul = [self._env[name][0] for name in order]
+        self._arrays = None
+
+    @classmethod
+    def from_library(cls, library, names=None, version=None):
+        """
+        Index of the references of a RefLoadLibrary
+        :param names: references to index, default all
+        :param version: only references computed with this model version
+        """
+        return cls(library.envelopes(names, version))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._env
+
+    def add(self, name, ul, fl):
+        """
+        Insert or replace a reference envelope
+        """
+        if name in self._env:
+            self.remove(name)
+        i = bisect.bisect_left(self._ul, ul)
+        self._ul.insert(i, float(ul))
+        self._names.insert(i, name)
+        self._env[name] = (float(ul), float(fl))
+        self._arrays = None
+
+    def remove(self, name):
+        ul, _ = self._env.pop(name)
+        i = bisect.bisect_left(self._ul, ul)
+        i += self._names[i:].index(name)
+        del self._ul[i], self._names[i]
+        self._arrays = None
+
+    def match(self, ul, fl, top=None):
+        """
+        References covering every turbine of a site, tightest first
+        :param ul: unnormalized ultimate load of every turbine (or its maximum)
+        :param fl: unnormalized fatigue load equivalence of every turbine (or its maximum)
+        :param top: number of references returned, default all covering references
+        :return: data frame [ul_envelope, fl_envelope, ul_margin, fl_margin, margin] by reference name,
+                 margins relative to the site maximum, margin = min(ul_margin, fl_margin)
+        """
+        ul_max = float(np.max(ul))
+        fl_max = float(np.max(fl))
+        if self._arrays is None:
+            self._arrays = (np.array(self._ul), np.array([self._env[name][1] for name in self._names]),
+                            np.array(self._names, dtype=object))
+        ul_env, fl_env, names = self._arrays
+
+        start = bisect.bisect_left(self._ul, ul_max)
+        cover = np.flatnonzero(fl_env[start:] >= fl_max) + start
+        result = pd.DataFrame({'ul_envelope': ul_env[cover], 'fl_envelope': fl_env[cover]},
+                              index=pd.Index(names[cover], name='reference'))
+        result['ul_margin'] = result['ul_envelope'] / ul_max - 1
+        result['fl_margin'] = result['fl_envelope'] / fl_max - 1
+        result['margin'] = np.minimum(result['ul_margin'], result['fl_margin'])
+        result = result.sort_values('margin', kind='mergesort')
+
+        return result if top is None else result.iloc[:top]
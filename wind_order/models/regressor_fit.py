@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Least-squares refit of the load regressors from simulation results
+
+The simulation table has one row per simulated case: the DLC name, the wind condition
+(θmean/α/ρ/V50 or inflow_angle/wind_shear/air_density/V50), the turbulence intensity
+features of TiInterp (ETM3, I15_m10, Ir_m1, ...) and the load channels. One design matrix
+(case x variable, the constant and every variable of every DLC) is built for the whole
+table, the Gram matrix and right-hand side of every DLC are reduced from its rows, and all
+DLC regressions of the same variables are solved as one batched system.
+
+Without a template every DLC regresses on the constant, the four wind conditions and the
+single TI feature that fits it best, the form of the Regress_* workbooks.
+
+@author: 36719
+"""
+
+import numpy as np
+import pandas as pd
+from .regressor_store import RegressorSet
+from .calc_load import REGRESSOR_CONDITION, UL_NAME, FL_NAME
+
+
+BASE_VARIABLES = ['const', 'inflow_angle', 'wind_shear', 'air_density', 'V50']
+PREFIX = {UL_NAME: 'Regress_UL_', FL_NAME: 'Regress_RF_'}
+
+
+def fit_regressor(cases, load_name, template=None, ti_features=None, dlc_column='dlc', prefix=None):
+    """
+    Fit the regressor of every DLC of a simulation table
+    :param cases: data frame of simulated cases, dlc values are the DLC names of the regressor files ('01', 'Case001')
+    :param load_name: load channel fitted, e.g. 'UL_TB_Mxy'
+    :param template: RegressorSet whose DLC and variables are refitted, default every DLC of the table with the
+                     best single TI feature
+    :param ti_features: candidate TI feature columns without template, default every other numeric column
+    :param dlc_column: column of the DLC names
+    :param prefix: file name prefix of the regressor workbooks, default from the template or the load channel
+    :return: RegressorSet (without source signature), diagnostics data frame by dlc
+             [cases, variables, ti_feature, r2, rmse, max_error, cond]
+    """
+    columns = {REGRESSOR_CONDITION.get(c, c): c for c in cases.columns}
+    codes, dlc_table = pd.factorize(cases[dlc_column].astype(str), sort=True)
+    dlc_table = list(dlc_table)
+
+    if template is not None:
+        missing = sorted(set(template.dlc) - set(dlc_table))
+        if missing:
+            raise ValueError(f'No simulated case of dlc {missing}')
+        dlc = list(template.dlc)
+        variables = list(template.variables)
+        prefix = prefix or template.files[0][:11]
+    else:
+        dlc = list(dlc_table)
+        if ti_features is None:
+            skip = set(BASE_VARIABLES) | {dlc_column, load_name, UL_NAME, FL_NAME}
+            ti_features = [c for c, source in columns.items()
+                           if c not in skip and pd.api.types.is_numeric_dtype(cases[source])]
+        variables = BASE_VARIABLES + [c for c in ti_features if c not in BASE_VARIABLES]
+        prefix = prefix or PREFIX.get(load_name, 'Regress_UL_')
+
+    # shared design matrix, rows grouped by dlc
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(dlc_table) + 1))
+    position = {name: i for i, name in enumerate(dlc_table)}
+    x = np.ones((len(cases), len(variables)), dtype=np.float64)
+    for j, var in enumerate(variables):
+        if var in columns:
+            x[:, j] = np.asarray(cases[columns[var]], dtype=np.float64)[order]
+        elif var != 'const':
+            raise ValueError(f'Simulation table has no column {var!r}')
+    y = np.asarray(cases[load_name], dtype=np.float64)[order]
+
+    # normal equations of every dlc, columns scaled to unit norm for conditioning
+    gram = np.empty((len(dlc), len(variables), len(variables)))
+    rhs = np.empty((len(dlc), len(variables)))
+    rows = np.empty(len(dlc), dtype=np.int64)
+    for i, name in enumerate(dlc):
+        start, stop = bounds[position[name]], bounds[position[name] + 1]
+        gram[i] = x[start:stop].T @ x[start:stop]
+        rhs[i] = x[start:stop].T @ y[start:stop]
+        rows[i] = stop - start
+    scale = np.sqrt(np.einsum('ijj->ij', gram))
+    scale[scale == 0] = 1
+    gram /= scale[:, :, None] * scale[:, None, :]
+    rhs /= scale
+
+    if template is not None:
+        mask = np.asarray(template.mask, dtype=bool)
+    else:
+        mask = _select_ti(gram, rhs, len(BASE_VARIABLES))
+
+    coef = np.zeros(mask.shape)
+    cond = np.empty(len(dlc))
+    patterns, group = np.unique(mask, axis=0, return_inverse=True)
+    for g, pattern in enumerate(patterns):
+        members = np.flatnonzero(group.ravel() == g)
+        sub = np.flatnonzero(pattern)
+        short = rows[members] < len(sub)
+        if short.any():
+            raise ValueError(f'Fewer simulated cases than variables for dlc {[dlc[i] for i in members[short]]}')
+        a = gram[np.ix_(members, sub, sub)]
+        b = rhs[np.ix_(members, sub)]
+        coef[np.ix_(members, sub)] = _solve(a, b)
+        cond[members] = np.linalg.cond(a)
+    coef /= scale
+
+    # keep the variables used by any dlc
+    used = mask.any(axis=0)
+    variables = [var for var, u in zip(variables, used) if u]
+    coef, mask = coef[:, used], mask[:, used]
+
+    diagnostics = _diagnostics(x[:, used], y, bounds, position, dlc, coef, mask, variables, rows, cond)
+    files = [f'{prefix}{name}.xlsx' for name in dlc] if template is None else list(template.files)
+
+    return RegressorSet(files, dlc, variables, coef, mask, []), diagnostics
+
+
+def _select_ti(gram, rhs, n_base):
+    """
+    Mask of the base variables and the TI feature leaving the smallest residual, for every dlc at once
+    """
+    n_dlc, n_var = rhs.shape
+    candidates = np.arange(n_base, n_var)
+    if len(candidates) == 0:
+        raise ValueError('Simulation table has no TI feature column')
+    idx = np.hstack([np.tile(np.arange(n_base), (len(candidates), 1)), candidates[:, None]])
+    a = gram[:, idx[:, :, None], idx[:, None, :]]
+    b = rhs[:, idx]
+    beta = _solve(a.reshape(-1, n_base + 1, n_base + 1), b.reshape(-1, n_base + 1)).reshape(b.shape)
+    # y'y minus the residual sum of squares, the normal equations hold at the solution
+    explained = np.einsum('ijk,ijk->ij', beta, b)
+    best = candidates[np.argmax(explained, axis=1)]
+
+    mask = np.zeros((n_dlc, n_var), dtype=bool)
+    mask[:, :n_base] = True
+    mask[np.arange(n_dlc), best] = True
+
+    return mask
+
+
+def _solve(a, b):
+    """
+    Batched solution of a @ beta = b, least squares for singular systems
+    """
+    try:
+        return np.linalg.solve(a, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.stack([np.linalg.lstsq(a_i, b_i, rcond=None)[0] for a_i, b_i in zip(a, b)])
+
+
+def _diagnostics(x, y, bounds, position, dlc, coef, mask, variables, rows, cond):
+    r2 = np.empty(len(dlc))
+    rmse = np.empty(len(dlc))
+    max_error = np.empty(len(dlc))
+    for i, name in enumerate(dlc):
+        start, stop = bounds[position[name]], bounds[position[name] + 1]
+        y_i = y[start:stop]
+        residual = y_i - x[start:stop] @ coef[i]
+        sse = residual @ residual
+        sst = np.sum((y_i - y_i.mean()) ** 2)
+        r2[i] = 1 - sse / sst if sst > 0 else np.nan
+        rmse[i] = np.sqrt(sse / len(y_i))
+        max_error[i] = np.max(np.abs(residual))
+
+    base = set(BASE_VARIABLES)
+    ti_feature = [next((v for v, m in zip(variables, row) if m and v not in base), '') for row in mask]
+
+    return pd.DataFrame({'cases': rows, 'variables': mask.sum(axis=1), 'ti_feature': ti_feature, 'r2': r2,
+                         'rmse': rmse, 'max_error': max_error, 'cond': cond}, index=pd.Index(dlc, name='dlc'))
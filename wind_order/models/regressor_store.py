@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled regressor store
+
+The Regress_UL_* / Regress_RF_Case* workbooks of a folder are parsed once and
+compiled into a single binary artifact (.npz) next to the workbooks. The artifact
+holds the coefficient matrix (dlc x variable), the DLC and variable names and the
+mtime/size/sha1 of every source workbook, and is rebuilt as soon as any of them
+changes. Loaded sets are shared in memory by every model of the process.
+
+@author: 36719
+"""
+
+import os
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from wind_order.utils import file_digest
+from wind_order.utils import span
+
+
+STORE_VERSION = 1
+
+# in-memory regressor sets shared by the whole process, {(folder, pattern, load_name): RegressorSet}
+_STORES = {}
+_LOCK = threading.Lock()
+
+
+class RegressorSet:
+    """
+    Coefficient matrix of one regressor folder
+    :param files: source workbook names, sorted
+    :param dlc: DLC names (file name without 'Regress_UL_'/'Regress_RF_' prefix and extension)
+    :param variables: names of the regressor variables (columns of coef)
+    :param coef: coefficient matrix, dlc x variable
+    :param mask: True where the variable appears in the workbook of the dlc
+    :param signature: (file, mtime_ns, size, sha1) of every source workbook
+    """
+
+    def __init__(self, files, dlc, variables, coef, mask, signature):
+        self.files = list(files)
+        self.dlc = list(dlc)
+        self.variables = list(variables)
+        self.coef = coef
+        self.mask = mask
+        self.signature = list(signature)
+
+    def __len__(self):
+        return len(self.dlc)
+
+    def to_dict(self):
+        """
+        Regressor as {file name: pd.Series(coefficient, index=variable)}
+        """
+        regressor = {}
+        variables = np.array(self.variables, dtype=object)
+        for i, file in enumerate(self.files):
+            regressor[file] = pd.Series(self.coef[i, self.mask[i]], index=variables[self.mask[i]])
+
+        return regressor
+
+    def feature_matrix(self, *frames):
+        """
+        Align turbine frames on the regressor variables
+        :param frames: turbine x feature TurbineTables or data frames, searched in order (e.g. wind condition, then ti)
+        :return: turbine x variable matrix; variables found in no frame are constant terms (1.0)
+        """
+        n_turbine = len(frames[0])
+        features = np.ones((n_turbine, len(self.variables)), dtype=np.float64)
+        for j, var in enumerate(self.variables):
+            for df in frames:
+                if var in df.columns:
+                    features[:, j] = np.asarray(df[var], dtype=np.float64)
+                    break
+
+        return features
+
+    def evaluate(self, features):
+        """
+        Loads of all turbines and dlc in one matrix product
+        :param features: turbine x variable matrix from feature_matrix()
+        :return: turbine x dlc matrix
+        """
+        return features @ self.coef.T
+
+    def nbytes(self):
+        return self.coef.nbytes + self.mask.nbytes
+
+
+def load_regressor(folder, pattern, load_name, cache=True):
+    """
+    Get the compiled regressor set of a folder, compiling it if missing or out of date
+    :param folder: folder of regressor excel
+    :param pattern: compiled regular expression matching the regressor file names
+    :param load_name: column of the load channel, e.g. 'UL_TB_Mxy'
+    :param cache: keep the set in the in-memory store of the process; False leaves the set to the caller,
+                  e.g. a PlatformRegistry bounding the memory of many platforms
+    :return: RegressorSet
+    """
+    folder = os.path.abspath(folder)
+    key = (folder, pattern.pattern, load_name)
+    stats = _stat_files(folder, pattern)
+
+    with _LOCK:
+        reg_set = _STORES.get(key) if cache else None
+        if reg_set is not None and _same_stats(reg_set.signature, stats):
+            return reg_set
+
+        with span('regressor load', 'io', folder=folder, load=load_name):
+            store_path = _store_path(folder, pattern, load_name)
+            reg_set = _read_store(store_path)
+            if reg_set is None or not _same_stats(reg_set.signature, stats):
+                signature = [(f, m, s, file_digest(os.path.join(folder, f))) for f, m, s in stats]
+                if reg_set is None or [d[3] for d in reg_set.signature] != [d[3] for d in signature] \
+                        or [d[0] for d in reg_set.signature] != [d[0] for d in signature]:
+                    reg_set = _compile(folder, signature, load_name)
+                else:  # only touched, contents unchanged
+                    reg_set.signature = signature
+                _write_store(store_path, reg_set)
+
+        if cache:
+            _STORES[key] = reg_set
+
+    return reg_set
+
+
+def is_current(reg_set, folder, pattern):
+    """
+    True if the workbooks of the folder are still those the set was compiled from (by mtime and size)
+    """
+    return _same_stats(reg_set.signature, _stat_files(os.path.abspath(folder), pattern))
+
+
+def compile_regressor(folder, pattern, load_name):
+    """
+    Force the one-time build step of a regressor folder
+    :return: RegressorSet
+    """
+    folder = os.path.abspath(folder)
+    stats = _stat_files(folder, pattern)
+    signature = [(f, m, s, file_digest(os.path.join(folder, f))) for f, m, s in stats]
+    reg_set = _compile(folder, signature, load_name)
+    _write_store(_store_path(folder, pattern, load_name), reg_set)
+    with _LOCK:
+        _STORES[(folder, pattern.pattern, load_name)] = reg_set
+
+    return reg_set
+
+
+def save_regressor(reg_set, folder, pattern, load_name):
+    """
+    Write a regressor set as Regress_* workbooks and their compiled artifact, so load_regressor
+    (and CalcUltimateLoad) use the folder without parsing the workbooks again
+    :param reg_set: RegressorSet, e.g. from fit_regressor
+    :param folder: output folder, its other workbooks matching the pattern must not exist
+    :param pattern: compiled regular expression matching the regressor file names
+    :param load_name: column of the load channel, e.g. 'UL_TB_Mxy'
+    :return: RegressorSet with the signature of the written workbooks
+    """
+    folder = os.path.abspath(folder)
+    os.makedirs(folder, exist_ok=True)
+    stale = [file for file, _, _ in _stat_files(folder, pattern) if file not in reg_set.files]
+    if stale:
+        raise ValueError(f'{folder} holds regressor workbooks not in the set: {stale}')
+
+    look_up = {en: zh for zh, en in _ZH.items() if zh != '最大入流角β'}
+    for i, file in enumerate(reg_set.files):
+        names = [var for var, m in zip(reg_set.variables, reg_set.mask[i]) if m]
+        values = reg_set.coef[i, reg_set.mask[i]]
+        order = sorted(range(len(names)), key=lambda k: names[k] not in look_up)
+        if sum(names[k] not in look_up for k in order) > 1:
+            raise ValueError(f'{file}: a regressor workbook holds one variable besides {list(look_up)}')
+        rows = [[reg_set.dlc[i], None], ['变量', load_name], ['-', '-']]
+        rows += [[look_up.get(names[k], names[k]), values[k]] for k in order]
+        pd.DataFrame(rows).to_excel(os.path.join(folder, file), header=False, index=False)
+
+    stats = _stat_files(folder, pattern)
+    signature = [(f, m, s, file_digest(os.path.join(folder, f))) for f, m, s in stats]
+    order = [reg_set.files.index(d[0]) for d in signature]
+    reg_set = RegressorSet([reg_set.files[i] for i in order], [reg_set.dlc[i] for i in order], reg_set.variables,
+                           reg_set.coef[order], reg_set.mask[order], signature)
+    _write_store(_store_path(folder, pattern, load_name), reg_set)
+    with _LOCK:
+        _STORES[(folder, pattern.pattern, load_name)] = reg_set
+
+    return reg_set
+
+
+def clear_regressor_cache():
+    """
+    Drop the in-memory regressor sets of this process
+    """
+    with _LOCK:
+        _STORES.clear()
+
+
+def _compile(folder, signature, load_name):
+    columns = []
+    for file, _, _, _ in signature:
+        with span('excel read', 'io', path=file):
+            df = pd.read_excel(os.path.join(folder, file), index_col=0, header=None)
+        df.drop([df.index[0], df.index[2]], inplace=True)
+        df.columns = df.loc[df.index[0]]
+        df.drop(df.index[0], inplace=True)
+        df.index = _repl_zh(df.index)
+        columns.append(df[load_name].astype(np.float64))
+
+    variables = []
+    for col in columns:
+        variables.extend(var for var in col.index if var not in variables)
+
+    var_idx = {var: j for j, var in enumerate(variables)}
+    coef = np.zeros((len(columns), len(variables)), dtype=np.float64)
+    mask = np.zeros(coef.shape, dtype=bool)
+    for i, col in enumerate(columns):
+        for var, value in zip(col.index, col.values):
+            coef[i, var_idx[var]] += value
+            mask[i, var_idx[var]] = True
+
+    files = [d[0] for d in signature]
+    dlc = [_dlc_name(f) for f in files]
+
+    return RegressorSet(files, dlc, variables, coef, mask, signature)
+
+
+_ZH = {'常量': 'const', '最大入流角β': 'inflow_angle', '平均入流角β': 'inflow_angle',
+       '风切变α': 'wind_shear', '空气密度ρ': 'air_density', '极限风速V50': 'V50'}
+
+
+def _repl_zh(list_zh):
+    """
+    --- Convert chinese character to alphanumeric character ---
+    :param list_zh:
+    :return list_en:
+    """
+
+    look_up = _ZH
+    list_en = [look_up[zh] for zh in list_zh if zh in look_up.keys()]
+    if list_zh[-1] not in look_up.keys():
+        list_en.append(list_zh[-1])
+
+    return list_en
+
+
+def _dlc_name(file):
+    # 'Regress_UL_01.xls' -> '01', 'Regress_RF_Case001.xls' -> 'Case001'
+    return os.path.splitext(file)[0][11:]
+
+
+def _stat_files(folder, pattern):
+    stats = []
+    for file in sorted(os.listdir(folder)):
+        if pattern.match(file):
+            st = os.stat(os.path.join(folder, file))
+            stats.append((file, st.st_mtime_ns, st.st_size))
+
+    return stats
+
+
+def _same_stats(signature, stats):
+    return [tuple(d[:3]) for d in signature] == [tuple(d) for d in stats]
+
+
+def _store_path(folder, pattern, load_name):
+    tag = hashlib.sha1(pattern.pattern.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(folder, f'.regressor_{load_name}_{tag}.npz')
+
+
+def _read_store(path):
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != STORE_VERSION:
+                return None
+            signature = [(str(f), int(m), int(s), str(h)) for f, m, s, h in
+                         zip(data['files'], data['mtimes'], data['sizes'], data['hashes'])]
+            return RegressorSet(data['files'].tolist(), data['dlc'].tolist(), data['variables'].tolist(),
+                                data['coef'], data['mask'], signature)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_store(path, reg_set):
+    """
+    Write the artifact atomically; a read-only regressor folder only keeps the set in memory
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, version=np.array(STORE_VERSION),
+                     files=np.array(reg_set.files, dtype=str),
+                     dlc=np.array(reg_set.dlc, dtype=str),
+                     variables=np.array(reg_set.variables, dtype=str),
+                     coef=reg_set.coef, mask=reg_set.mask,
+                     mtimes=np.array([d[1] for d in reg_set.signature], dtype=np.int64),
+                     sizes=np.array([d[2] for d in reg_set.signature], dtype=np.int64),
+                     hashes=np.array([d[3] for d in reg_set.signature], dtype=str))
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized evaluation of site parameter scenarios
+
+The whole chain rated wind speed -> turbulence intensity -> UL max / FL equivalence is
+evaluated for many (scenario, turbine) rows at once. Every row carries its own inflow angle,
+wind shear, air density, V50, Weibull K and A, and a factor on the turbulence curves.
+
+@author: 36719
+"""
+
+import numpy as np
+import pandas as pd
+from .calc_vr import CalcRatedWindSpeed, RATED_REGRESSOR
+from .ti_interp import TiInterp, ti_table, interp_shared, interp_each
+from .fatigue_case import DEFAULT_CASE_TABLE
+
+
+# θmean, α, ρ, V50, K, A of the site condition, TI: factor on the M=1, M=10 and ETM curves
+PARAMS = ('θmean', 'α', 'ρ', 'V50', 'K', 'A', 'TI')
+CONDITION = {'θmean': 'inflow_angle', 'α': 'wind_shear', 'ρ': 'air_density', 'V50': 'V50'}
+
+
+class ScenarioEngine:
+    """
+    Evaluate loads of (scenario, turbine) rows of one farm
+    :param wind_params: wind parameters of the farm, as WindParse outputs['cus']
+    :param regressor_ul: RegressorSet of ultimate load
+    :param regressor_fl: RegressorSet of fatigue load
+    :param case_table: FatigueCaseTable
+    :param rated_regressor: coefficients of rated wind speed
+    :param cut_out: cut-out wind speed of the fatigue case proportion
+    """
+
+    def __init__(self, wind_params, regressor_ul, regressor_fl, case_table=None, rated_regressor=None, cut_out=20):
+        self.turbines = list(wind_params['sites'])
+        self.regressor_ul = regressor_ul
+        self.regressor_fl = regressor_fl
+        self.case_table = case_table or DEFAULT_CASE_TABLE
+        self.rated_regressor = rated_regressor or RATED_REGRESSOR
+        self.cut_out = cut_out
+
+        condition = wind_params['condition'].loc[self.turbines]
+        self.base = condition[list(PARAMS[:-1])].astype(np.float64).assign(TI=1.0)
+
+        calc_vr = CalcRatedWindSpeed(wind_condition=condition, regressor=self.rated_regressor)
+        calc_vr.run()
+        ti_interp = TiInterp(**dict(wind_params, rws=calc_vr.pop()))
+        ti_interp.run()
+        ti = ti_interp.pop()
+        self.ti_names = ti.columns
+        self.ti_base = ti.matrix(self.ti_names)
+        self.ti_col = {name: j for j, name in enumerate(self.ti_names)}
+
+        self.x_m1, self.y_m1 = ti_table(wind_params['m1'], self.turbines)
+        self.x_m10, self.y_m10 = ti_table(wind_params['m10'], self.turbines)
+        self.ti_15_m10 = interp_shared(self.x_m10, self.y_m10, [15])[0]
+        self.ti_cut_out = int(wind_params['etm']['Wind Speed'].iloc[-1])
+
+    def row_bytes(self):
+        """
+        Approximate working memory of one row, for chunking
+        """
+        width = (len(self.ti_names) + len(self.regressor_ul.variables) + len(self.regressor_ul) +
+                 len(self.regressor_fl.variables) + 2 * len(self.regressor_fl) + len(self.case_table))
+
+        return 8 * width
+
+    def evaluate(self, values, turbine):
+        """
+        Unnormalized UL max and FL equivalence of every row
+        :param values: {param: (rows,) array}, absolute θmean, α, ρ, V50, K, A and the TI factor
+        :param turbine: (rows,) position of the turbine of every row in self.turbines
+        :return: ul (rows,), fl (rows,)
+        """
+        reg = self.rated_regressor
+        rws = (reg['const'] + reg['inflow_angle'] * values['θmean'] + reg['wind_shear'] * values['α'] +
+               reg['air_density'] * values['ρ'])
+
+        # turbulence intensity at the rated wind speed of every row, the rest is fixed per turbine
+        ti = self.ti_base[turbine]
+        ti[:, self.ti_col['Ir_m1']] = interp_each(self.x_m1, self.y_m1, rws, turbine)
+        ti[:, self.ti_col['Ir+2_m1']] = interp_each(self.x_m1, self.y_m1, rws + 2, turbine)
+        ti[:, self.ti_col['Ir-2_m1']] = interp_each(self.x_m1, self.y_m1, rws - 2, turbine)
+        ti[:, self.ti_col['Ir_m10']] = interp_each(self.x_m10, self.y_m10, rws, turbine)
+        v50 = values['V50']
+        wind_end = np.where(0.7 * v50 > self.ti_cut_out + 1, 0.7 * v50, self.ti_cut_out + 2)
+        ti[:, self.ti_col['Iend_m10']] = self.ti_15_m10[turbine] * (0.75 + 5.6 / wind_end) / (0.75 + 5.6 / 15)
+        ti *= values['TI'][:, None]
+
+        condition = pd.DataFrame({CONDITION[p]: values[p] for p in CONDITION})
+        ti = pd.DataFrame(ti, columns=self.ti_names)
+
+        ul = self.regressor_ul.evaluate(self.regressor_ul.feature_matrix(condition, ti)).max(axis=1)
+        fatigue_load = self.regressor_fl.evaluate(self.regressor_fl.feature_matrix(condition, ti))
+        p_case = self.case_table.proportion(values['K'], values['A'], v50, self.cut_out)
+        fl = np.power(np.einsum('ij,ij->i', np.power(fatigue_load, 4), p_case), 1/4)
+
+        return ul, fl
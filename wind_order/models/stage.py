@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed memoization of model stages
+
+A model (Base) is run through StageExecutor.run: its inputs, the content of its path inputs
+(regressor folders, workbooks) and the source code of the package models are fingerprinted,
+and the outputs are taken from the on-disk artifact cache when the fingerprint hits.
+
+@author: 36719
+"""
+
+import os
+import sys
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from wind_order.utils import DiskCache
+from wind_order.utils import file_digest
+from wind_order.utils import span
+from .turbine_table import TurbineTable
+
+
+# {path: (mtime_ns, size, digest)}, file digests reused while the file is untouched
+_DIGESTS = {}
+_VERSION = {}
+_LOCK = threading.Lock()
+
+
+class StageExecutor:
+    """
+    Run models, skipping those whose input fingerprint is in the artifact cache
+    :param folder: artifact cache folder
+    :param max_bytes: size bound of the cache, least recently used artifacts are evicted
+    """
+
+    def __init__(self, folder, max_bytes=1024 * 2 ** 20):
+        self.cache = DiskCache(folder, max_bytes=max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def run(self, model):
+        """
+        Run the model or restore its outputs from the cache
+        :param model: instance of a Base model
+        :return: model, ready to pop()
+        """
+        if not model.cacheable:
+            model.run()
+            return model
+
+        with span('stage cache', 'cache', model=model.model_type()):
+            key = self.fingerprint(model)
+            outputs = self.cache.get(key)
+        if outputs is not None:
+            self.hits += 1
+            model._outputs = outputs
+        else:
+            self.misses += 1
+            model.run()
+            self.cache.put(key, model.pop())
+
+        return model
+
+    @staticmethod
+    def fingerprint(model):
+        """
+        Fingerprint of model type, code version, inputs and the content of path inputs
+        """
+        h = hashlib.sha1()
+        h.update(model.model_type().encode('utf-8'))
+        h.update(code_version().encode('utf-8'))
+        for name, value in model._inputs.items():
+            h.update(str(name).encode('utf-8'))
+            if name in model.path_inputs:
+                _update_path(h, value)
+            else:
+                _update(h, value)
+
+        return h.hexdigest()
+
+
+def code_version():
+    """
+    Digest of the source of the wind_order models and utils, and of the python version
+    """
+    if 'code' not in _VERSION:
+        h = hashlib.sha1(sys.version.encode('utf-8'))
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for sub in ('models', 'utils'):
+            folder = os.path.join(root, sub)
+            for file in sorted(os.listdir(folder)):
+                if file.endswith('.py'):
+                    h.update(file.encode('utf-8'))
+                    h.update(path_digest(os.path.join(folder, file)).encode('utf-8'))
+        _VERSION['code'] = h.hexdigest()
+
+    return _VERSION['code']
+
+
+def path_digest(path):
+    """
+    Content digest of a file, or of the visible files of a folder
+    """
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        h = hashlib.sha1()
+        for file in sorted(os.listdir(path)):
+            if not file.startswith('.') and os.path.isfile(os.path.join(path, file)):
+                h.update(file.encode('utf-8'))
+                h.update(path_digest(os.path.join(path, file)).encode('utf-8'))
+        return h.hexdigest()
+
+    st = os.stat(path)
+    with _LOCK:
+        cached = _DIGESTS.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    digest = file_digest(path)
+    with _LOCK:
+        _DIGESTS[path] = (st.st_mtime_ns, st.st_size, digest)
+
+    return digest
+
+
+def _update_path(h, value):
+    if isinstance(value, (list, tuple)):
+        for v in value:
+            _update_path(h, v)
+    elif isinstance(value, (str, os.PathLike)):
+        h.update(path_digest(value).encode('utf-8'))
+    else:  # loaded object in place of its path, e.g. a RegressorSet
+        _update(h, value)
+
+
+def _update(h, value):
+    if isinstance(value, pd.DataFrame):
+        h.update(b'DataFrame')
+        _update(h, [list(value.columns), [str(d) for d in value.dtypes]])
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(b'Series')
+        _update(h, [value.name, str(value.dtype)])
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, TurbineTable):
+        h.update(b'TurbineTable')
+        _update(h, [value.index, value.columns])
+        for name in value.columns:
+            h.update(value[name].tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(f'ndarray{value.dtype}{value.shape}'.encode('utf-8'))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for k, v in value.items():
+            _update(h, k)
+            _update(h, v)
+    elif isinstance(value, (list, tuple)):
+        h.update(type(value).__name__.encode('utf-8'))
+        for v in value:
+            _update(h, v)
+    elif value is None or isinstance(value, (str, bool, int, float, np.generic)):
+        h.update(f'{type(value).__name__}:{value!r}'.encode('utf-8'))
+    elif hasattr(value, '__dict__'):
+        h.update(type(value).__qualname__.encode('utf-8'))
+        _update(h, {k: v for k, v in vars(value).items() if not k.startswith('_')})
+    else:
+        h.update(pickle.dumps(value, protocol=4))
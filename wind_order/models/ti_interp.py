@@ -5,20 +5,18 @@ Turbulent intensity interpolation at [rated, cut-out, rated-2, rated+2] wind spe
 @author: 36719
 """
 import numpy as np
-import pandas as pd
-from scipy.interpolate import interp1d
 from wind_order.models import Base
+from .turbine_table import TurbineTable, column_values
 
 
 class TiInterp(Base):
 
     def run(self):
         """
-
-        :return ti: turbulence intensity
+        --- Interpolate turbulence intensity of all turbines in one vectorized pass ---
+        :param self.rws: rated wind speed, TurbineTable with column 'rws' (or {turbine: value})
+        :return ti: TurbineTable of turbulence intensity features
         """
-        ti = {}
-
         turbine_sites = self._inputs['sites']
         wind_condition = self._inputs['condition']
         ti_m1 = self._inputs['m1']
@@ -29,7 +27,7 @@ class TiInterp(Base):
         # wind_cut_in = 2.5 if ti_etm['Wind Speed'].iloc[0] < 3 else 3
         # print(f'Tips: Cut-in wind speed is {wind_cut_in}m/s.')
 
-        wind_cut_in = 3
+        wind_cut_in = self._inputs.get('cut_in', 3)  # cut-in wind speed of the turbine platform
         wind_cut_out = int(ti_etm['Wind Speed'].iloc[-1])
         cut_out_list = [19, 19.5, 20, 20.5, 23, 23.5, 25]
 
@@ -44,46 +42,101 @@ class TiInterp(Base):
         etm_index = ['ETM' + str(d) for d in wind_linspace]
         Ix_m10_index = [''.join(['I', str(d), '_m10']) for d in wind_linspace]
 
-        for turbine_id in turbine_sites:
-            interpolator_m1 = interp1d(ti_m1['Wind Speed'].values, ti_m1[turbine_id].values, kind='linear')
-            interpolator_m10 = interp1d(ti_m10['Wind Speed'].values, ti_m10[turbine_id].values, kind='linear')
-            interpolator_etm = interp1d(ti_etm['Wind Speed'].values, ti_etm[turbine_id].values, kind='linear')
-
-            ti_r_m1 = interpolator_m1(rated_wind_speed[turbine_id])
-            ti_rp2_m1 = interpolator_m1(rated_wind_speed[turbine_id] + 2)
-            ti_rm2_m1 = interpolator_m1(rated_wind_speed[turbine_id] - 2)
-            ti_out_m1 = interpolator_m1(wind_cut_out)
-
-            ti_r_m10= interpolator_m10(rated_wind_speed[turbine_id])
-            ti_in_m10 = interpolator_m10(wind_cut_in)
-            ti_out_m10 = interpolator_m10(wind_cut_out)
-            wind_end = (0.7 * wind_condition.loc[turbine_id]['V50'] if 0.7 * wind_condition.loc[turbine_id]['V50'] >
-                        wind_cut_out + 1 else wind_cut_out + 2)
-            ti_end_m10 = interpolator_m10(15)*(0.75+5.6/wind_end)/(0.75+5.6/15)
-
-            end_value = 19 if wind_cut_out < 19 else wind_cut_out
-            interp_list = np.append(wind_linspace[:-1], end_value)
-            try:
-                ti_etm_interp_arr = interpolator_etm(interp_list)  # 利用切出风速求ETM20
-                ti_ix_m10_interp_arr = interpolator_m10(interp_list)  # 利用切出风速求I20_m10
-            except ValueError:
-                inner = [i for i in interp_list if i < ti_etm['Wind Speed'].values[-1]]
-                ti_etm_interp_inner = interpolator_etm(inner)
-                ti_outer = [float(interpolator_etm(wind_cut_out)) for i in interp_list if i > ti_etm['Wind Speed'].values[-1]]
-                ti_etm_interp_arr = np.array(ti_etm_interp_inner.tolist() + ti_outer)
-
-                ti_m10_interp_inner = interpolator_etm(inner)
-                ti_outer = [float(interpolator_etm(wind_cut_out)) for i in interp_list if i > ti_etm['Wind Speed'].values[-1]]
-                ti_ix_m10_interp_arr = np.array(ti_m10_interp_inner.tolist() + ti_outer)
-
-            ti_etmx = pd.Series(ti_etm_interp_arr, index=etm_index)
-            ti_ix_m10 = pd.Series(ti_ix_m10_interp_arr, index=Ix_m10_index)
-
-            ti_tail = pd.Series({'Ir_m1': ti_r_m1, 'Ir+2_m1': ti_rp2_m1, 'Ir-2_m1': ti_rm2_m1, 'Iout_m1': ti_out_m1,
-                                 'Ir_m10': ti_r_m10, 'Iin_m10': ti_in_m10, 'Iout_m10': ti_out_m10,
-                                 'Iend_m10': ti_end_m10})
-
-            ti[turbine_id] = pd.concat([ti_etmx, ti_ix_m10, ti_tail])
-
-        self._outputs = ti
-
+        turbine_sites = list(turbine_sites)
+        rws = column_values(rated_wind_speed, 'rws', turbine_sites)
+        v50 = column_values(wind_condition, 'V50', turbine_sites)
+        x_m1, y_m1 = ti_table(ti_m1, turbine_sites)
+        x_m10, y_m10 = ti_table(ti_m10, turbine_sites)
+        x_etm, y_etm = ti_table(ti_etm, turbine_sites)
+
+        # wind speeds differing per turbine
+        ti_r_m1 = interp_each(x_m1, y_m1, rws)
+        ti_rp2_m1 = interp_each(x_m1, y_m1, rws + 2)
+        ti_rm2_m1 = interp_each(x_m1, y_m1, rws - 2)
+        ti_r_m10 = interp_each(x_m10, y_m10, rws)
+
+        # wind speeds shared by all turbines
+        ti_out_m1 = interp_shared(x_m1, y_m1, [wind_cut_out])[0]
+        ti_in_m10, ti_out_m10, ti_15_m10 = interp_shared(x_m10, y_m10, [wind_cut_in, wind_cut_out, 15])
+        wind_end = np.where(0.7 * v50 > wind_cut_out + 1, 0.7 * v50, wind_cut_out + 2)
+        ti_end_m10 = ti_15_m10 * (0.75 + 5.6 / wind_end) / (0.75 + 5.6 / 15)
+
+        end_value = 19 if wind_cut_out < 19 else wind_cut_out
+        interp_list = np.append(wind_linspace[:-1], end_value)
+        if _in_range(x_etm, interp_list) and _in_range(x_m10, interp_list):
+            ti_etm_interp_arr = interp_shared(x_etm, y_etm, interp_list)  # 利用切出风速求ETM20
+            ti_ix_m10_interp_arr = interp_shared(x_m10, y_m10, interp_list)  # 利用切出风速求I20_m10
+        else:
+            # wind speed beyond the ETM table takes the value at cut-out; as before, from the ETM curve for both
+            inner = interp_list < x_etm[-1]
+            ti_etm_interp_arr = np.empty((len(interp_list), len(turbine_sites)))
+            ti_etm_interp_arr[inner] = interp_shared(x_etm, y_etm, interp_list[inner])
+            ti_etm_interp_arr[~inner] = interp_shared(x_etm, y_etm, [wind_cut_out])[0]
+            ti_ix_m10_interp_arr = ti_etm_interp_arr.copy()
+
+        columns = etm_index + Ix_m10_index + ['Ir_m1', 'Ir+2_m1', 'Ir-2_m1', 'Iout_m1',
+                                              'Ir_m10', 'Iin_m10', 'Iout_m10', 'Iend_m10']
+        # feature x turbine rows, transposed to a column-major turbine x feature block without copying
+        data = np.vstack([ti_etm_interp_arr, ti_ix_m10_interp_arr,
+                          ti_r_m1, ti_rp2_m1, ti_rm2_m1, ti_out_m1,
+                          ti_r_m10, ti_in_m10, ti_out_m10, ti_end_m10]).T
+
+        self._outputs = TurbineTable(turbine_sites).add_block(columns, data)
+
+
+def ti_table(df, turbine_sites):
+    """
+    --- Wind speed and turbulence intensity columns of all turbines, sorted by wind speed ---
+    :return x: (n,) wind speed; y: (n, turbine) turbulence intensity
+    """
+    turbine_sites = list(turbine_sites)
+    if len(df.columns) == len(turbine_sites) + 1 and df.columns[0] == 'Wind Speed' \
+            and df.columns[1:].tolist() == turbine_sites:
+        # table of exactly these turbines, e.g. built by the load service: no label lookup
+        values = df.to_numpy(dtype=np.float64)
+        x, y = values[:, 0], values[:, 1:]
+    else:
+        x = df['Wind Speed'].to_numpy(dtype=np.float64)
+        y = df[turbine_sites].to_numpy(dtype=np.float64)
+    order = np.argsort(x, kind='mergesort')
+
+    return x[order], y[order]
+
+
+def interp_shared(x, y, x_new):
+    """
+    --- Linear interpolation of all turbine columns at wind speeds shared by every turbine ---
+    :return: (len(x_new), turbine)
+    """
+    x_new, lo, hi = _locate(x, x_new)
+    slope = (y[hi] - y[lo]) / (x[hi] - x[lo])[:, None]
+
+    return slope * (x_new - x[lo])[:, None] + y[lo]
+
+
+def interp_each(x, y, x_new, col=None):
+    """
+    --- Linear interpolation with one wind speed per turbine column ---
+    :param col: turbine column of every wind speed, default one wind speed per column in order
+    :return: (len(x_new),)
+    """
+    x_new, lo, hi = _locate(x, x_new)
+    col = np.arange(y.shape[1]) if col is None else col
+    slope = (y[hi, col] - y[lo, col]) / (x[hi] - x[lo])
+
+    return slope * (x_new - x[lo]) + y[lo, col]
+
+
+def _in_range(x, x_new):
+    return np.all((x_new >= x[0]) & (x_new <= x[-1]))
+
+
+def _locate(x, x_new):
+    x_new = np.asarray(x_new, dtype=np.float64)
+    if np.any(x_new < x[0]):
+        raise ValueError("A value in x_new is below the interpolation range.")
+    if np.any(x_new > x[-1]):
+        raise ValueError("A value in x_new is above the interpolation range.")
+    hi = np.clip(np.searchsorted(x, x_new), 1, len(x) - 1)
+
+    return x_new, hi - 1, hi
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar turbine table shared by the calculation models
+
+One turbine index and a set of contiguous float64 columns. Stages append their outputs as
+new columns without copying (a turbine x feature block is kept in column-major order, so
+each of its columns is a contiguous view), and downstream stages read read-only views.
+
+@author: 36719
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class TurbineTable:
+    """
+    Turbine x column table of float64 arrays
+    :param index: turbine ids
+    :param columns: {name: array of len(index)}, appended in order
+    """
+
+    def __init__(self, index, columns=None):
+        self.index = list(index)
+        self._columns = {}
+        self._pos = None
+        for name, values in (columns or {}).items():
+            self.add(name, values)
+
+    @classmethod
+    def from_frame(cls, df, columns=None, rename=None):
+        """
+        Table of the columns of a turbine x feature data frame
+        :param columns: columns to take, default all
+        :param rename: {frame column: table column}
+        """
+        columns = list(df.columns) if columns is None else list(columns)
+        block = df[columns].to_numpy(dtype=np.float64)
+        names = [(rename or {}).get(c, c) for c in columns]
+
+        return cls(df.index).add_block(names, block)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def shape(self):
+        return len(self.index), len(self._columns)
+
+    def position(self, turbines):
+        """
+        Row positions of turbine ids
+        """
+        if self._pos is None:
+            self._pos = {turbine: i for i, turbine in enumerate(self.index)}
+
+        return np.array([self._pos[turbine] for turbine in turbines], dtype=np.int64)
+
+    def add(self, name, values):
+        """
+        Append (or replace) one column; float64 contiguous arrays are kept without copying
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if values.shape != (len(self.index),):
+            raise ValueError(f'Column [{name}] has shape {values.shape}, expected ({len(self.index)},)')
+        view = values.view()
+        view.flags.writeable = False
+        self._columns[name] = view
+
+        return self
+
+    def add_block(self, names, block):
+        """
+        Append the columns of a turbine x len(names) block, stored column-major, each column a view
+        """
+        block = np.asfortranarray(block, dtype=np.float64)
+        if block.shape != (len(self.index), len(names)):
+            raise ValueError(f'Block has shape {block.shape}, expected ({len(self.index)}, {len(names)})')
+        for j, name in enumerate(names):
+            self.add(name, block[:, j])
+
+        return self
+
+    def join(self, other):
+        """
+        Append all columns of a table with the same turbine index, without copying
+        """
+        if other.index != self.index:
+            raise ValueError('Turbine tables of different turbines cannot be joined')
+        for name in other.columns:
+            self._columns[name] = other[name]
+
+        return self
+
+    def select(self, names, rename=None):
+        """
+        Table of some columns sharing the arrays of this table
+        """
+        table = TurbineTable(self.index)
+        for name in names:
+            table._columns[(rename or {}).get(name, name)] = self._columns[name]
+
+        return table
+
+    def take(self, turbines):
+        """
+        Table of some turbines (rows are copied)
+        """
+        pos = self.position(turbines)
+
+        return TurbineTable(turbines, {name: values[pos] for name, values in self._columns.items()})
+
+    def matrix(self, names):
+        """
+        Turbine x len(names) matrix of the columns
+        """
+        return np.column_stack([self._columns[name] for name in names]) if names else \
+            np.empty((len(self.index), 0), dtype=np.float64)
+
+    def series(self, name):
+        return pd.Series(self._columns[name], index=self.index, name=name)
+
+    def to_frame(self, names=None):
+        """
+        Data frame of the columns
+        """
+        names = self.columns if names is None else list(names)
+
+        return pd.DataFrame({name: self._columns[name] for name in names}, index=self.index, columns=names)
+
+    def __getstate__(self):
+        return {'index': self.index, 'columns': self._columns}
+
+    def __setstate__(self, state):
+        self.__init__(state['index'], state['columns'])
+
+    def __repr__(self):
+        return f'TurbineTable({len(self.index)} turbines, columns={self.columns})'
+
+
+def column_values(source, name, turbines):
+    """
+    float64 values of one column for the turbines, from a TurbineTable, a data frame,
+    a series or a {turbine: value} dict
+    """
+    turbines = list(turbines)
+    if isinstance(source, TurbineTable):
+        return source[name] if source.index == turbines else source[name][source.position(turbines)]
+    if isinstance(source, pd.DataFrame):
+        return source.loc[turbines, name].to_numpy(dtype=np.float64)
+    if isinstance(source, pd.Series):
+        return source.loc[turbines].to_numpy(dtype=np.float64)
+
+    return np.array([source[turbine] for turbine in turbines], dtype=np.float64)
@@ -6,12 +6,25 @@ Get wind parameter from standard excel file
 """
 
 import os
-import numpy as np
 import pandas as pd
 from .base_model import Base
+from .calc_load import CONDITION
+from wind_order.utils import DiskCache
+from wind_order.utils import file_digest
+from wind_order.utils import read_sheet_blocks
+from wind_order.utils import normalize_sheet
+from wind_order.utils import span
+
+
+PARSE_VERSION = 5                 # bump when the cleaned frames change, invalidates the workbook cache
+CACHE_SIZE = 512 * 2 ** 20
+LIBRARY_NAME = 'ref_loads.sqlite'
+TEXT_CELLS = {'keep_default_na': False, 'na_values': ['']}  # read_excel: only empty cells are missing
 
 
 class WindParse(Base):
+    # parsed workbooks have their own cache keyed by content hash
+    cacheable = False
 
     def run(self):
 
@@ -21,83 +34,99 @@ class WindParse(Base):
         
         wind_path = self._inputs['path']
         ref_wind_path = self._inputs['ref_path']
-        cur_dir = self._inputs['cur_dir']
 
         cur_wind_params = self.__excel_paras(wind_path)
-        ref_load_dir = os.path.abspath(os.path.join(cur_dir, '../files/Loads'))
-
-        ref_wind_params = []
-        ref_loads_path = []
-        if len(ref_wind_path) > 0:
-            ref_loads_path = [os.path.join(ref_load_dir, os.path.split(d)[-1].replace('.xlsx', '_loads.json'))
-                              for d in ref_wind_path]
 
-            #  如果Loads路径下没有参考风参对应的载荷，则在func_run.py计算载荷；如果存在, 则在func_run.py导入载荷
-            for i, ref_load in enumerate(ref_loads_path):
-                if not os.path.exists(ref_load) or not os.path.getsize(ref_load):
-                    ref_wind_params.append(self.__excel_paras(ref_wind_path[i]))
-                else:
-                    ref_wind_params.append(0)
+        #  参考风参的载荷由 compute.prepare_refs 计算并存入载荷库，此处只给出参考风参名称
+        ref_names = [os.path.splitext(os.path.split(d)[-1])[0] for d in ref_wind_path]
 
-        self._outputs = {'cus': cur_wind_params, 'ref': ref_wind_params, 'ref_loads_path': ref_loads_path}
+        self._outputs = {'cus': cur_wind_params, 'ref_names': ref_names}
 
     def __excel_paras(self, path):
-        wind_params = {}
-        
-        # base data
-        wind_condition = pd.read_excel(path, sheet_name='Site Condition', index_col=0)
-        wind_condition = self.__clean_data(wind_condition)
-
-        # wind base parameters
-        wind_params['condition'] = wind_condition
+        cache = self.__cache()
+        reader = self.__reader(path)
+        digest = file_digest(path)
+        key = f'{digest}-v{PARSE_VERSION}-{reader}' if cache is not None else None
+        frames = cache.get(key) if cache is not None else None
+        if frames is None:
+            with span('excel read', 'io', path=path, reader=reader):
+                frames = self.__read_stream(path) if reader == 'stream' else self.__read_excel(path)
+            if cache is not None:
+                cache.put(key, frames)
+
+        wind_params = dict(frames)
 
         # turbine sites
-        wind_params['sites'] = list(wind_condition.index)
-
-        # turbulence m1
-        wind_data_m1 = pd.read_excel(path, sheet_name='M=1')
-        wind_params['m1'] = self.__clean_data(wind_data_m1)
-
-        # turbulence m1
-        wind_data_m10 = pd.read_excel(path, sheet_name='M=10')
-        wind_params['m10'] = self.__clean_data(wind_data_m10)
-
-        # turbulence etm
-        wind_data_etm = pd.read_excel(path, sheet_name='ETM')
-        wind_params['etm'] = self.__clean_data(wind_data_etm)
+        wind_params['sites'] = list(wind_params['condition'].index)
 
         wind_params['filename'] = os.path.splitext(os.path.split(path)[-1])[0]
+        wind_params['digest'] = digest
 
         return wind_params
 
-    # @staticmethod
-    def __clean_data(self, df_raw):
+    def __cache(self):
         """
-        --- Remove useless data ---
-        :param df_raw: original data frame
-        :return df_fine: data frame except useless data (e.g. Note)
+        Cache of parsed workbooks keyed by content hash,
+        input 'cache': True (default, files/Cache/WindParse), False, or a DiskCache
         """
+        cache = self._inputs.get('cache', True)
+        if cache is True:
+            cache_dir = os.path.abspath(os.path.join(self._inputs['cur_dir'], '../files/Cache/WindParse'))
+            cache = DiskCache(cache_dir, max_bytes=self._inputs.get('cache_size', CACHE_SIZE))
 
-        rows = df_raw.shape[0]
-        for head_idx, head_str in enumerate(df_raw.columns):
-            if 'Unnamed:' in head_str:
-                cols = head_idx
-                break
-        else:
-            cols = head_idx + 1
+        return cache or None
 
-        df_fine = df_raw.iloc[0:rows, 0:cols].dropna(how='all')
-        df_fine.drop(df_fine.index[0], inplace=True)  # drop first line (unit)
+    def __reader(self, path):
+        """
+        Workbook reader, input 'reader': 'stream' (default, .xlsx/.xlsm) or 'pandas'
+        """
+        reader = self._inputs.get('reader', 'stream')
+        if reader == 'stream' and not path.lower().endswith(('.xlsx', '.xlsm')):
+            reader = 'pandas'
 
-        return self.__fill_data(df_fine)
+        return reader
+
+    def __read_stream(self, path):
+        """
+        Open the workbook once and read only the data block of the four sheets
+        """
+        sheets = {'Site Condition': 0, 'M=1': None, 'M=10': None, 'ETM': None}
+        blocks = read_sheet_blocks(path, sheets)
+
+        return {'condition': self.__normalize_condition(blocks['Site Condition']),
+                'm1': normalize_sheet(blocks['M=1'], sheet='M=1'),
+                'm10': normalize_sheet(blocks['M=10'], sheet='M=10'),
+                'etm': normalize_sheet(blocks['ETM'], sheet='ETM')}
 
     @staticmethod
-    def __fill_data(df):
-        for row_i, row_name in enumerate(df.index):
-            if pd.isnull(df.loc[row_name]).any():
-                line = [df.iloc[row_i - 1, col_i] if pd.isnull(data) 
-                    else data for col_i, data in enumerate(df.loc[row_name])]
-                df.loc[row_name] = np.array(line)
-            
-        return df
+    def __normalize_condition(wind_condition):
+        """
+        Site condition sheet, the columns read by the models must be numeric,
+        descriptive columns (e.g. turbine type, remark) are kept as text
+        """
+        text_columns = [c for c in wind_condition.columns if c not in CONDITION]
+
+        return normalize_sheet(wind_condition, sheet='Site Condition', text_columns=text_columns)
+
+    def __read_excel(self, path):
+        frames = {}
+
+        # base data
+        wind_condition = pd.read_excel(path, sheet_name='Site Condition', index_col=0, **TEXT_CELLS)
+
+        # wind base parameters
+        frames['condition'] = self.__normalize_condition(wind_condition)
+
+        # turbulence m1
+        wind_data_m1 = pd.read_excel(path, sheet_name='M=1', **TEXT_CELLS)
+        frames['m1'] = normalize_sheet(wind_data_m1, sheet='M=1')
+
+        # turbulence m1
+        wind_data_m10 = pd.read_excel(path, sheet_name='M=10', **TEXT_CELLS)
+        frames['m10'] = normalize_sheet(wind_data_m10, sheet='M=10')
+
+        # turbulence etm
+        wind_data_etm = pd.read_excel(path, sheet_name='ETM', **TEXT_CELLS)
+        frames['etm'] = normalize_sheet(wind_data_etm, sheet='ETM')
 
+        return frames
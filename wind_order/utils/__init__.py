@@ -0,0 +1,9 @@
+from .disk_cache import DiskCache
+from .disk_cache import file_digest
+from .excel_reader import read_sheet_blocks
+from .sheet import normalize_sheet
+from .quantile import StreamingQuantiles
+from .profiler import Profiler
+from .profiler import span
+from .result_sink import ResultSink
+from .result_sink import open_sink
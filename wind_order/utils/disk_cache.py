@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache with size-bounded LRU eviction
+
+@author: 36719
+"""
+
+import os
+import pickle
+import hashlib
+
+
+class DiskCache:
+    """
+    Pickled objects stored as one file per key in a folder;
+    the total size of the folder is bounded, least recently used entries are evicted first
+    :param folder: cache folder, created on first write
+    :param max_bytes: size bound of the folder
+    """
+
+    suffix = '.pkl'
+
+    def __init__(self, folder, max_bytes=512 * 2 ** 20):
+        self.folder = os.path.abspath(folder)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.folder, key + self.suffix)
+
+    def get(self, key, default=None):
+        """
+        Cached object of the key, or default on miss; a hit marks the entry as recently used,
+        an entry that cannot be unpickled (truncated, or written by other library versions) is removed
+        """
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return default
+        try:
+            with f:
+                value = pickle.load(f)
+        except Exception:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return value
+
+    def put(self, key, value):
+        """
+        Store the object atomically and evict old entries beyond max_bytes
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the folder fits in max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(self.suffix):
+                try:
+                    st = os.stat(os.path.join(self.folder, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, name))
+
+        total = sum(d[1] for d in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        if os.path.isdir(self.folder):
+            for name in os.listdir(self.folder):
+                if name.endswith(self.suffix):
+                    os.remove(os.path.join(self.folder, name))
+
+
+def file_digest(path):
+    """
+    sha1 of the file content
+    :param path:
+    :return: hex digest
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Single-open streaming reader for the data block of excel sheets
+
+@author: 36719
+"""
+
+import pandas as pd
+
+
+def read_sheet_blocks(path, sheets):
+    """
+    Open the workbook once in read-only mode and read the bounded data block of every sheet:
+    columns up to the first empty header cell, rows whose data cells are all empty are skipped
+    like dropna(how='all') of the pandas path
+    :param path: path of .xlsx workbook
+    :param sheets: {sheet name: index column (0) or None}
+    :return: {sheet name: data frame}, shaped like pd.read_excel(path, sheet_name, index_col)
+    """
+    from openpyxl import load_workbook
+
+    frames = {}
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet_name, index_col in sheets.items():
+            if sheet_name not in wb.sheetnames:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found")
+            frames[sheet_name] = _read_block(wb[sheet_name], index_col)
+    finally:
+        wb.close()
+
+    return frames
+
+
+def _read_block(ws, index_col):
+    rows = ws.iter_rows(values_only=True)
+    header = list(next(rows, ()))
+
+    # data columns end at the first empty header (pandas 'Unnamed:' column), index column excluded
+    first = 1 if index_col is not None else 0
+    cols = len(header)
+    for i in range(first, len(header)):
+        if header[i] is None:
+            cols = i
+            break
+    header = header[:cols]
+
+    # blank rows between turbines or wind speeds are dropped, the rows after them are kept
+    data, position = [], []
+    for k, row in enumerate(ws.iter_rows(min_row=2, max_col=cols, values_only=True)):
+        row = row[:cols] + (None,) * (cols - len(row))
+        if all(v is None for i, v in enumerate(row) if i != index_col):
+            continue
+        data.append(row)
+        position.append(k)
+
+    df = pd.DataFrame(data, columns=header, index=position)
+    if index_col is not None:
+        df = df.set_index(df.columns[index_col])
+        # an empty header cell leaves the index unnamed, as read_excel does
+        df.index.name = None if pd.isna(header[index_col]) else header[index_col]
+
+    return df
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Spans of wall time, CPU time and peak allocated memory
+
+Every Base.run() and the spans opened with span() (excel reads, regressor loads, reference
+loading, plotting) are recorded while a Profiler is active. Without an active Profiler a span
+is one global lookup, so the instrumentation stays in production code.
+
+    with Profiler() as prof:
+        main_run(...)
+    prof.save('profile.json')   # chrome://tracing, Perfetto
+    print(prof.summary())
+
+@author: 36719
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+
+# active profiler of the process, None when disabled
+_PROFILER = None
+
+
+class Profiler:
+    """
+    Record spans while active
+    :param memory: trace peak allocated memory with tracemalloc (slows allocation-heavy code)
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._started_tracemalloc = False
+        self._previous = None
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def enable(self):
+        global _PROFILER
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._previous = _PROFILER
+        _PROFILER = self
+
+        return self
+
+    def disable(self):
+        global _PROFILER
+        if _PROFILER is self:
+            _PROFILER = self._previous
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def span(self, name, cat='span', **args):
+        stack = self._stack()
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        frame = {'base': current if memory else 0, 'peak': current if memory else 0}
+        stack.append(frame)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            cpu = time.thread_time() - cpu
+            end = time.perf_counter()
+            stack.pop()
+            event = {'name': name, 'cat': cat, 'ts': wall - self._t0, 'dur': end - wall, 'cpu': cpu,
+                     'tid': threading.get_ident(), 'depth': len(stack), 'args': args}
+            if memory:
+                frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                event['peak_bytes'] = frame['peak'] - frame['base']
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], frame['peak'])
+            with self._lock:
+                self.events.append(event)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        return stack
+
+    def chrome_trace(self):
+        """
+        Events in the Chrome trace event format (complete events, microseconds)
+        """
+        pid = os.getpid()
+        events = []
+        for e in self.events:
+            args = dict(e['args'], cpu_ms=round(e['cpu'] * 1e3, 3))
+            if 'peak_bytes' in e:
+                args['peak_bytes'] = e['peak_bytes']
+            events.append({'name': e['name'], 'cat': e['cat'], 'ph': 'X', 'pid': pid, 'tid': e['tid'],
+                           'ts': round(e['ts'] * 1e6, 1), 'dur': round(e['dur'] * 1e6, 1),
+                           'args': {k: _json_value(v) for k, v in args.items()}})
+
+        return {'traceEvents': sorted(events, key=lambda e: e['ts']), 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+    def stats(self):
+        """
+        Totals by span name in order of first start
+        :return: [{'name', 'cat', 'count', 'wall', 'cpu', 'peak_bytes'}]
+        """
+        table = {}
+        for e in sorted(self.events, key=lambda e: e['ts']):
+            row = table.setdefault(e['name'], {'name': e['name'], 'cat': e['cat'], 'count': 0, 'wall': 0.0,
+                                               'cpu': 0.0, 'peak_bytes': None})
+            row['count'] += 1
+            row['wall'] += e['dur']
+            row['cpu'] += e['cpu']
+            if 'peak_bytes' in e:
+                row['peak_bytes'] = max(row['peak_bytes'] or 0, e['peak_bytes'])
+
+        return list(table.values())
+
+    def summary(self):
+        """
+        One line per span name: count, wall time, CPU time, peak allocated memory
+        """
+        lines = [f"{'span':32s}{'count':>7s}{'wall s':>10s}{'cpu s':>10s}{'peak MB':>10s}"]
+        for row in self.stats():
+            peak = '' if row['peak_bytes'] is None else f"{row['peak_bytes'] / 2 ** 20:.1f}"
+            lines.append(f"{row['name'][:31]:32s}{row['count']:7d}{row['wall']:10.3f}{row['cpu']:10.3f}{peak:>10s}")
+
+        return '\n'.join(lines)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, cat='span', **args):
+    """
+    Span of the active profiler, a shared no-op context if profiling is disabled
+    """
+    if _PROFILER is None:
+        return _NO_SPAN
+
+    return _PROFILER.span(name, cat, **args)
+
+
+def profiled(func=None, name=None, cat='span'):
+    """
+    Decorator recording every call of func as a span
+    """
+    if func is None:
+        return functools.partial(profiled, name=name, cat=cat)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _PROFILER is None:
+            return func(*args, **kwargs)
+        with _PROFILER.span(name or func.__qualname__, cat):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def active_profiler():
+    return _PROFILER
+
+
+def _json_value(value):
+    return value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming percentiles of many series on a fixed histogram
+
+@author: 36719
+"""
+
+import numpy as np
+
+
+class StreamingQuantiles:
+    """
+    Percentiles of n_series series accumulated batch by batch in bounded memory;
+    values are counted on bins of [lower, upper], percentiles are exact to one bin width
+    :param n_series: number of series (e.g. turbines)
+    :param lower: lower bound of the values, smaller values are counted in the first bin
+    :param upper: upper bound of the values, larger values are counted in the last bin
+    :param bins: number of bins per series
+    """
+
+    def __init__(self, n_series, lower=0.0, upper=1.0, bins=10000):
+        self.n_series = n_series
+        self.lower = float(lower)
+        self.upper = float(upper)
+        self.bins = bins
+        self.counts = np.zeros((n_series, bins), dtype=np.int64)
+        self.total = np.zeros(n_series, dtype=np.float64)
+        self.min = np.full(n_series, np.inf)
+        self.max = np.full(n_series, -np.inf)
+
+    @property
+    def count(self):
+        return self.counts.sum(axis=1)
+
+    def update(self, values):
+        """
+        Accumulate a batch
+        :param values: sample x series array
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self.n_series)
+        width = (self.upper - self.lower) / self.bins
+        idx = np.clip(((values - self.lower) / width).astype(np.int64), 0, self.bins - 1)
+        idx += np.arange(self.n_series, dtype=np.int64) * self.bins
+        self.counts += np.bincount(idx.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        self.total += values.sum(axis=0)
+        self.min = np.minimum(self.min, values.min(axis=0, initial=np.inf))
+        self.max = np.maximum(self.max, values.max(axis=0, initial=-np.inf))
+
+    def mean(self):
+        return self.total / np.maximum(self.count, 1)
+
+    def percentile(self, q):
+        """
+        Percentile q (0-100) of every series, linear within the bin, clipped to the observed min/max
+        :return: (n_series,)
+        """
+        cum = np.cumsum(self.counts, axis=1)
+        n = cum[:, -1]
+        rank = q / 100 * n
+        b = np.array([np.searchsorted(row, r, side='left') for row, r in zip(cum, rank)], dtype=np.int64)
+        b = np.minimum(b, self.bins - 1)
+        rows = np.arange(self.n_series)
+        before = np.where(b > 0, cum[rows, np.maximum(b - 1, 0)], 0)
+        inside = self.counts[rows, b]
+        frac = np.where(inside > 0, (rank - before) / np.maximum(inside, 1), 0.0)
+        width = (self.upper - self.lower) / self.bins
+        value = self.lower + (b + frac) * width
+
+        return np.where(n > 0, np.clip(value, self.min, self.max), np.nan)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Result sinks written incrementally, one table at a time
+
+A sink receives data frames for named tables (e.g. 'ul', 'fl', 'ul_dlc', 'fl_dlc', 'ti') as
+the results are produced, per farm or chunk, and appends them to the table: Parquet row
+groups, Arrow IPC (Feather v2) record batches, CSV rows, or Excel sheet rows for reporting.
+
+    with open_sink('out', 'parquet') as sink:      # out/ul.parquet, out/fl.parquet, ...
+        sink.write('ul', frame)
+
+A sink path is a folder (one file per table) or a file whose extension gives the format;
+the main table (default the first table written) owns a file path, the others go to
+<stem>_<table><ext>.
+Parquet and Feather need pyarrow.
+
+@author: 36719
+"""
+
+import os
+import pandas as pd
+
+
+FORMATS = {'.parquet': 'parquet', '.feather': 'feather', '.arrow': 'feather', '.csv': 'csv',
+           '.xlsx': 'excel', '.xls': 'excel'}
+
+
+class ResultSink:
+    """
+    Base class of the sinks
+    :param path: folder (one file per table) or file path
+    :param main: table written to a file path, default the first table written
+    """
+    extension = ''
+
+    def __init__(self, path, main=None):
+        self.path = os.path.abspath(path)
+        self.is_dir = os.path.splitext(self.path)[1].lower() not in FORMATS
+        self.rows = {}
+        self._main = main
+        os.makedirs(self.path if self.is_dir else os.path.dirname(self.path), exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def table_path(self, table):
+        if self.is_dir:
+            return os.path.join(self.path, f'{table}{self.extension}')
+        if self._main is None:
+            self._main = table
+        if self._main == table:
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+
+        return f'{stem}_{table}{ext}'
+
+    def write(self, table, frame):
+        """
+        Append the rows of a data frame to a table, the index is not written; empty frames are skipped
+        """
+        if frame.empty:
+            return
+        self._write(table, frame)
+        self.rows[table] = self.rows.get(table, 0) + len(frame)
+
+    def _write(self, table, frame):
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Flush and close every table
+        """
+
+
+class CsvSink(ResultSink):
+    extension = '.csv'
+
+    def __init__(self, path, main=None):
+        super().__init__(path, main)
+        self._files = {}
+
+    def _write(self, table, frame):
+        first = table not in self._files
+        if first:
+            self._files[table] = open(self.table_path(table), 'w', newline='', encoding='utf-8')
+        frame.to_csv(self._files[table], header=first, index=False)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+class ParquetSink(ResultSink):
+    extension = '.parquet'
+
+    def __init__(self, path, main=None):
+        super().__init__(path, main)
+        self._writers = {}
+
+    def _write(self, table, frame):
+        pa = _pyarrow()
+        import pyarrow.parquet as pq
+
+        writer = self._writers.get(table)
+        if writer is None:
+            data = pa.Table.from_pandas(frame, preserve_index=False)
+            writer = self._writers[table] = pq.ParquetWriter(self.table_path(table), data.schema)
+        else:
+            data = pa.Table.from_pandas(frame, schema=writer.schema, preserve_index=False)
+        writer.write_table(data)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+class FeatherSink(ResultSink):
+    extension = '.feather'
+
+    def __init__(self, path, main=None):
+        super().__init__(path, main)
+        self._writers = {}
+
+    def _write(self, table, frame):
+        pa = _pyarrow()
+        import pyarrow.ipc
+
+        writer = self._writers.get(table)
+        if writer is None:
+            data = pa.Table.from_pandas(frame, preserve_index=False)
+            writer = self._writers[table] = (pa.ipc.new_file(self.table_path(table), data.schema), data.schema)
+        else:
+            data = pa.Table.from_pandas(frame, schema=writer[1], preserve_index=False)
+        writer[0].write_table(data)
+
+    def close(self):
+        for writer, _ in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+class ExcelSink(ResultSink):
+    """
+    Excel workbook for reporting, one sheet per table; the workbook is kept in memory until close
+    """
+    extension = '.xlsx'
+
+    def __init__(self, path, main=None):
+        super().__init__(path, main)
+        self._writers = {}
+
+    def table_path(self, table):
+        return os.path.join(self.path, f'loads{self.extension}') if self.is_dir else self.path
+
+    def _write(self, table, frame):
+        path = self.table_path(table)
+        writer = self._writers.get(path)
+        if writer is None:
+            writer = self._writers[path] = pd.ExcelWriter(path)
+        start = self.rows.get(table, 0)
+        frame.to_excel(writer, sheet_name=table[:31], startrow=start + 1 if start else 0, header=not start,
+                       index=False)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+SINKS = {'parquet': ParquetSink, 'feather': FeatherSink, 'csv': CsvSink, 'excel': ExcelSink}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Parquet and Feather results need pyarrow, pip install pyarrow '
+                          '(or wind_order[arrow]), or write csv / excel') from None
+
+    return pyarrow
+
+
+def open_sink(path, fmt=None, main=None):
+    """
+    Sink of a folder or file path
+    :param path: folder, or file whose extension gives the format (.parquet, .feather, .csv, .xlsx)
+    :param fmt: 'parquet', 'feather', 'csv' or 'excel'; default from the extension, parquet for a folder;
+                must agree with the extension of a file path
+    :param main: table written to a file path, default the first table written
+    :return: ResultSink
+    """
+    if isinstance(path, ResultSink):
+        return path
+    ext = os.path.splitext(path)[1].lower()
+    fmt = fmt or FORMATS.get(ext, 'parquet')
+    if fmt not in SINKS:
+        raise ValueError(f'Unknown result format {fmt!r}, expected one of {list(SINKS)}')
+    if ext in FORMATS and FORMATS[ext] != fmt:
+        raise ValueError(f'Result format {fmt!r} does not match the extension of {path!r}, '
+                         f'use {SINKS[fmt].extension} or a folder')
+
+    return SINKS[fmt](path, main)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Normalization of raw excel sheets shared by all models
+
+@author: 36719
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_sheet(df_raw, max_rows=None, sheet='', text_columns=()):
+    """
+    --- Remove useless data and regularize a raw sheet ---
+    header trimming (up to the first 'Unnamed:' column), unit row removal,
+    forward fill of missing values from the previous row, float64 coercion
+    :param df_raw: original data frame
+    :param max_rows: keep at most max_rows data rows
+    :param sheet: sheet name, reported when a cell is not a number
+    :param text_columns: columns kept as text, every other column must be numeric
+    :return df_fine: data frame except useless data (e.g. Note), data columns as float64
+    """
+    cols = len(df_raw.columns)
+    for head_idx, head_str in enumerate(df_raw.columns):
+        if 'Unnamed:' in str(head_str):
+            cols = head_idx
+            break
+
+    df_fine = df_raw.iloc[:, :cols].dropna(how='all')
+    df_fine = df_fine.iloc[1:]  # drop first line (unit)
+    if max_rows is not None:
+        df_fine = df_fine.iloc[:max_rows]
+
+    df_fine = df_fine.apply(lambda col: col if col.name in text_columns else _to_float(col, sheet))
+
+    return df_fine.ffill()
+
+
+def _to_float(col, sheet):
+    """
+    Column as float64, a cell that is not a number raises ValueError naming the sheet, column and row
+    """
+    try:
+        return pd.to_numeric(col, errors='raise').astype(np.float64)
+    except (ValueError, TypeError):
+        bad = pd.to_numeric(col, errors='coerce').isna() & col.notna()
+        pos = int(np.flatnonzero(bad.to_numpy())[0]) if bad.any() else 0
+        raise ValueError(f'Sheet {sheet!r}, column {col.name!r}, row {col.index[pos]}: '
+                         f'{col.iloc[pos]!r} is not a number') from None